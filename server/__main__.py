@@ -1,19 +1,31 @@
 import uvicorn
 
+from server.services.embedding_server import (
+    start_embedding_server_process,
+    stop_embedding_server_process,
+)
 from server.settings import settings
 
 
 def main() -> None:
     """Entrypoint of the application."""
-    uvicorn.run(
-        "server.web.application:get_app",
-        workers=settings.workers_count,
-        host=settings.host,
-        port=settings.port,
-        reload=settings.reload,
-        log_level=settings.log_level.value.lower(),
-        factory=True,
-    )
+    embedding_server = None
+    if settings.embedding_server_enabled:
+        embedding_server = start_embedding_server_process()
+
+    try:
+        uvicorn.run(
+            "server.web.application:get_app",
+            workers=settings.workers_count,
+            host=settings.host,
+            port=settings.port,
+            reload=settings.reload,
+            log_level=settings.log_level.value.lower(),
+            factory=True,
+        )
+    finally:
+        if embedding_server is not None:
+            stop_embedding_server_process(embedding_server)
 
 
 if __name__ == "__main__":
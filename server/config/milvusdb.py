@@ -1,22 +1,280 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from functools import lru_cache
+from typing import Optional
+
 from pymilvus import Collection, connections, utility
+from pymilvus.client.types import LoadState
 
+from server.config.logging import logging
 from server.settings import settings
 
+METRIC_TYPE = "COSINE"
 
-def get_milvusdb():
-    try:
+# Used when neither Settings nor the tuned profile give search params.
+DEFAULT_SEARCH_PARAMS = {
+    "HNSW": {"ef": 64},
+    "IVF_FLAT": {"nprobe": 16},
+    "IVF_SQ8": {"nprobe": 16},
+}
+
+# Partition key of the collection: the owner of the file a chunk comes from,
+# so a search only touches the partitions of the bot owner's files.
+PARTITION_KEY_FIELD = "owner"
+
+
+class MilvusManager:
+    """
+    Process-wide Milvus connection and collection handle.
+
+    The connection is opened and the collection looked up once, then reused
+    by every search, insert, query and delete. After a failure, reconnects
+    are attempted with exponential backoff instead of on every call.
+
+    The collection is loaded once per connection. Writes only append and
+    are counted as pending; they are flushed on a schedule by
+    `flush_milvus_writes`, or explicitly with `flush()` when a batch must be
+    persisted before it is reported as done.
+    """
+
+    def __init__(self, alias: str = "default"):
+        self.alias = alias
+        self._collection: Optional[Collection] = None
+        self._lock = threading.Lock()
+        self._retry_at = 0.0
+        self._backoff = settings.milvus_reconnect_min_delay
+        self.last_error: Optional[str] = None
+        self.last_checked_at: Optional[float] = None
+        self.load_state: Optional[str] = None
+        self._pending_writes = 0
+        self._flush_lock = threading.Lock()
+        # Whether the collection uses the owner partition key layout.
+        self.partitioned = False
+        self.index_type: Optional[str] = None
+        self.index_build_params: Optional[dict] = None
+
+    @property
+    def healthy(self) -> bool:
+        return self._collection is not None
+
+    def _connect(self):
         connections.connect(
-            alias="default",
+            alias=self.alias,
             user=settings.milvus_db_username,
             password=settings.milvus_db_password,
             host=settings.milvus_db_host,
             port=settings.milvus_db_port,
             db_name="default",
+            timeout=settings.milvus_connect_timeout,
+        )
+        if not utility.has_collection(settings.milvus_db_collection, using=self.alias):
+            raise Exception(
+                f"Milvus collection {settings.milvus_db_collection} does not exist",
+            )
+        collection = Collection(settings.milvus_db_collection, using=self.alias)
+        self.partitioned = any(
+            field.name == PARTITION_KEY_FIELD and field.is_partition_key
+            for field in collection.schema.fields
         )
+        index = next(iter(collection.indexes), None)
+        self.index_type = index.params.get("index_type") if index else None
+        self.index_build_params = (
+            normalize_index_params(index.params.get("params")) if index else None
+        )
+        self._ensure_loaded(collection)
+        return collection
+
+    def _ensure_loaded(self, collection: Collection):
+        state = utility.load_state(collection.name, using=self.alias)
+        if state != LoadState.Loaded:
+            logging.info(f"Loading Milvus collection {collection.name} ({state.name})")
+            collection.load()
+        self.load_state = LoadState.Loaded.name
+
+    def load(self):
+        """Reload the collection on demand, e.g. after an index change."""
+        collection = self.get_collection()
+        if collection is not None:
+            collection.load()
+            self.load_state = LoadState.Loaded.name
+
+    def mark_written(self, count: int = 1):
+        with self._flush_lock:
+            self._pending_writes += count
+
+    def flush(self):
+        """Persist pending writes; a no-op when nothing was written."""
+        with self._flush_lock:
+            pending_writes, self._pending_writes = self._pending_writes, 0
+        if not pending_writes:
+            return
+
+        collection = self.get_collection()
+        try:
+            if collection is None:
+                raise Exception("Not connect milvus DB")
+            collection.flush()
+        except Exception:
+            self.mark_written(pending_writes)
+            raise
+        logging.info(f"Flushed {pending_writes} Milvus writes")
+
+    def _fail(self, e: Exception):
+        self._collection = None
+        self.load_state = None
+        self.last_error = str(e)
+        self._retry_at = time.monotonic() + self._backoff
+        logging.error(
+            f"Error: Milvus unavailable ({e}), retrying in {self._backoff:.0f}s",
+        )
+        self._backoff = min(self._backoff * 2, settings.milvus_reconnect_max_delay)
+
+    def get_collection(self) -> Optional[Collection]:
+        collection = self._collection
+        if collection is not None:
+            return collection
+
+        with self._lock:
+            if self._collection is None and time.monotonic() >= self._retry_at:
+                try:
+                    self._collection = self._connect()
+                    self._backoff = settings.milvus_reconnect_min_delay
+                    self.last_error = None
+                    logging.info(f"Connected to Milvus {settings.milvus_db_host}")
+                except Exception as e:
+                    self._fail(e)
+            return self._collection
+
+    def check(self) -> bool:
+        """Ping the server, dropping the cached handle if it is unreachable."""
+        collection = self.get_collection()
+        if collection is None:
+            return False
+        try:
+            # Also reloads the collection if the server released it.
+            self._ensure_loaded(collection)
+        except Exception as e:
+            with self._lock:
+                self._fail(e)
+                connections.disconnect(self.alias)
+        self.last_checked_at = time.time()
+        return self.healthy
 
-        if utility.has_collection(settings.milvus_db_collection):
-            return Collection(settings.milvus_db_collection)
+    def health(self) -> dict:
+        return {
+            "healthy": self.healthy,
+            "collection": settings.milvus_db_collection,
+            "last_error": self.last_error,
+            "last_checked_at": self.last_checked_at,
+            "load_state": self.load_state,
+            "pending_writes": self._pending_writes,
+            "partitioned": self.partitioned,
+            "index_type": self.index_type,
+            "index_params": self.index_build_params,
+        }
 
+
+milvus_manager = MilvusManager()
+
+
+def get_milvusdb():
+    return milvus_manager.get_collection()
+
+
+def index_params(
+    index_type: str = settings.milvus_index_type,
+    params: Optional[dict] = None,
+) -> dict:
+    return {
+        "index_type": index_type,
+        "metric_type": METRIC_TYPE,
+        "params": settings.milvus_index_params if params is None else params,
+    }
+
+
+def normalize_index_params(params) -> dict:
+    """Build params as plain numbers, whether they come from Settings, a
+    profile or Milvus (which may return them as a JSON string, or their
+    values as strings)."""
+    if isinstance(params, str):
+        params = json.loads(params)
+    normalized = {}
+    for name, value in (params or {}).items():
+        if isinstance(value, str) and value.lstrip("-").isdigit():
+            value = int(value)
+        normalized[name] = value
+    return normalized
+
+
+def index_config_key(index_type: str, params) -> str:
+    return json.dumps(
+        {"index_type": index_type, "params": normalize_index_params(params)},
+        sort_keys=True,
+    )
+
+
+@lru_cache(maxsize=None)
+def _load_search_profile(path: str) -> Optional[dict]:
+    if not os.path.exists(path):
         return None
-    except:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except Exception as e:
+        logging.error(f"Error: could not read search profile {path}: {e}")
         return None
+
+
+def max_search_limit() -> int:
+    """Most hits a chat search asks for: the hybrid or rerank candidates."""
+    return max(settings.hybrid_candidates, settings.rerank_candidates)
+
+
+def search_params(limit: int) -> dict:
+    """
+    Search params for the index the collection actually has, returning
+    `limit` hits.
+
+    A tuned setting is only used for the exact index it was tuned on, and
+    only for limits up to the k it was tuned at: an nprobe tuned for
+    nlist=64 or for top 5 would lose recall on an nlist=1024 index or for
+    top 20. HNSW's ef is raised to at least `limit`, which Milvus requires.
+    """
+    index_type = milvus_manager.index_type or settings.milvus_index_type
+    build_params = (
+        milvus_manager.index_build_params
+        if milvus_manager.index_type
+        else settings.milvus_index_params
+    )
+    params = dict(DEFAULT_SEARCH_PARAMS.get(index_type, {}))
+
+    profile = _load_search_profile(settings.milvus_search_profile_path) or {}
+    tuned = profile.get("indexes", {}).get(index_config_key(index_type, build_params))
+    if tuned and limit <= profile.get("k", 0):
+        params.update(tuned["search_params"])
+    params.update(settings.milvus_search_params)
+    if index_type == "HNSW":
+        params["ef"] = max(params.get("ef", 0), limit)
+    return {"metric_type": METRIC_TYPE, "params": params}
+
+
+async def watch_milvus():
+    """Periodically check Milvus so a dead connection is noticed and replaced
+    between requests rather than during one."""
+    loop = asyncio.get_event_loop()
+    while True:
+        await loop.run_in_executor(None, milvus_manager.check)
+        await asyncio.sleep(settings.milvus_health_check_interval)
+
+
+async def flush_milvus_writes():
+    loop = asyncio.get_event_loop()
+    while True:
+        await asyncio.sleep(settings.milvus_flush_interval)
+        try:
+            await loop.run_in_executor(None, milvus_manager.flush)
+        except Exception as e:
+            logging.error(f"Error: {e}")
@@ -1,12 +1,42 @@
+from typing import Optional
+
 import motor.motor_asyncio
 
 from server.config.logging import logging
 from server.settings import settings
 
+_client: Optional[motor.motor_asyncio.AsyncIOMotorClient] = None
+
+
+def connect_mongodb() -> motor.motor_asyncio.AsyncIOMotorClient:
+    """Create the process-wide client, once per process."""
+    global _client
+    if _client is None:
+        options = dict(
+            maxPoolSize=settings.mongodb_max_pool_size,
+            minPoolSize=settings.mongodb_min_pool_size,
+            maxIdleTimeMS=settings.mongodb_max_idle_time_ms,
+            connectTimeoutMS=settings.mongodb_connect_timeout_ms,
+            serverSelectionTimeoutMS=settings.mongodb_server_selection_timeout_ms,
+            socketTimeoutMS=settings.mongodb_socket_timeout_ms or None,
+        )
+        if settings.mongodb_compressors:
+            options["compressors"] = settings.mongodb_compressors
+        _client = motor.motor_asyncio.AsyncIOMotorClient(settings.mongodb_url, **options)
+    return _client
+
+
+def close_mongodb():
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
+
 
 def get_db():
     try:
-        client = motor.motor_asyncio.AsyncIOMotorClient(settings.mongodb_url)
+        # Created on first use outside the app too, e.g. in the worker and scripts.
+        client = connect_mongodb()
         db = client.CodeChat
         return db
     except Exception as e:
@@ -7,8 +7,11 @@ from pydantic import BaseModel
 
 from server.config.logging import logging
 from server.config.mongodb import get_db
+from server.services.answer_cache import knowledge_version
 from server.services.auth import get_current_user
+from server.services.llm_registry import resolve_response_model
 from server.services.openai_service import fetch_answer_by_file_ids_and_chat_id
+from server.settings import settings
 from server.web.api.chat_history.schema import ChatMessage
 from server.web.api.file.schema import FileStatus
 from server.web.api.notification.schema import Notification
@@ -237,12 +240,41 @@ class SocketIOApp:
                 #     )
                 #     return
 
-                loop = asyncio.get_event_loop()
+                async def emit_chunk(text):
+                    # Partial answer text; the final "message" event carries
+                    # the whole answer as before.
+                    await self.sio.emit("message_chunk", {"chunk": text}, room=sid)
+
+                async def emit_stream_error():
+                    # The chunks sent so far are void; the final "message"
+                    # event that follows carries the fallback answer.
+                    await self.sio.emit(
+                        "message_error",
+                        {"error": "Đã có lỗi xảy ra", "reset": True},
+                        room=sid,
+                    )
+
+                hybrid = (
+                    settings.hybrid_search_default
+                    if existing_bot.get("hybrid_search") is None
+                    else existing_bot["hybrid_search"]
+                )
                 answer =  await fetch_answer_by_file_ids_and_chat_id(
                         query=data.get("message"),
                         file_ids=file_ids,
                         chat_id=chat_history_id,
-                        response_model=existing_bot.get("response_model")
+                        response_model=existing_bot.get("response_model"),
+                        owners=list({str(file["owner"]) for file in files if file.get("owner")}),
+                        hybrid=hybrid,
+                        bot_id=bot_id,
+                        knowledge_version=knowledge_version(
+                            files,
+                            resolve_response_model(existing_bot.get("response_model")),
+                            hybrid=hybrid,
+                        ),
+                        use_cache=not data.get("bypass_cache", False),
+                        on_token=emit_chunk,
+                        on_stream_error=emit_stream_error,
                 )
 
                 
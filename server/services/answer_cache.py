@@ -0,0 +1,241 @@
+import hashlib
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import List, Optional
+
+import numpy as np
+from bson import Binary
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+from server.config.logging import logging
+from server.config.mongodb import get_db
+from server.settings import settings
+
+COLLECTION_NAME = "answer_cache"
+
+# Raised by create_index when an index exists with different options.
+INDEX_OPTIONS_CONFLICT = 85
+
+
+def knowledge_version(
+    files: List[dict],
+    response_model: Optional[str] = None,
+    hybrid: bool = False,
+) -> str:
+    """
+    Fingerprint of what a bot's answers are built from.
+
+    Covers the bot's files with their content version and ingestion status,
+    so adding or removing a file from `list_files`, replacing its content
+    or finishing a reindex all give a new version and the answers cached
+    under the old one stop matching. So does a change of the model or of
+    the retrieval: the bot's `hybrid` search and the rerank settings.
+    """
+    parts = sorted(
+        f"{file['_id']}:{file.get('version', 1)}:{file.get('status')}"
+        for file in files
+    )
+    parts.append(f"model:{response_model}")
+    parts.append(f"hybrid:{bool(hybrid)}")
+    parts.append(
+        f"rerank:{settings.rerank_model if settings.rerank_enabled else None}",
+    )
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+
+class AnswerCacheMetrics:
+    """Per-process counters of the answer cache."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.stored = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "stored": self.stored,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+answer_cache_metrics = AnswerCacheMetrics()
+
+
+async def ensure_answer_cache_indexes():
+    collection = get_db().get_collection(COLLECTION_NAME)
+    await collection.create_index(
+        [("bot_id", ASCENDING), ("knowledge_version", ASCENDING), ("created_at", DESCENDING)],
+    )
+    ttl_seconds = int(settings.answer_cache_ttl_seconds)
+    try:
+        await collection.create_index("created_at", expireAfterSeconds=ttl_seconds)
+    except OperationFailure as e:
+        if e.code != INDEX_OPTIONS_CONFLICT:
+            raise
+        # answer_cache_ttl_seconds changed since the index was created.
+        await get_db().command(
+            "collMod",
+            COLLECTION_NAME,
+            index={"keyPattern": {"created_at": 1}, "expireAfterSeconds": ttl_seconds},
+        )
+        logging.info(f"Answer cache TTL changed to {ttl_seconds}s")
+
+
+def _normalize(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / (np.linalg.norm(vector) + 1e-12)
+
+
+class AnswerIndex:
+    """
+    In-process matrix of the cached question vectors of each bot and
+    knowledge version, so a lookup is one matrix product instead of a
+    Mongo read of every stored vector.
+
+    A bot's entries are loaded once and then extended by this process's own
+    stores; they are reloaded after `ttl_seconds` to pick up answers stored
+    by other processes. At most `max_bots` bots are kept, least recently
+    used first out.
+    """
+
+    def __init__(
+        self,
+        max_bots: int = settings.answer_cache_max_bots,
+        ttl_seconds: float = settings.answer_cache_index_ttl_seconds,
+    ):
+        self.max_bots = max_bots
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict = OrderedDict()
+
+    async def _load(self, bot_id: str, version: str) -> dict:
+        documents = (
+            await get_db()
+            .get_collection(COLLECTION_NAME)
+            .find(
+                {
+                    "bot_id": bot_id,
+                    "knowledge_version": version,
+                    # Normalized float32 bytes.
+                    "vector": {"$type": "binData"},
+                },
+                {"_id": 0, "vector": 1, "answer": 1, "query": 1},
+            )
+            .sort("created_at", DESCENDING)
+            .limit(settings.answer_cache_max_entries_per_bot)
+            .to_list(length=None)
+        )
+        return {
+            "loaded_at": time.monotonic(),
+            "vectors": (
+                np.stack(
+                    [np.frombuffer(document["vector"], dtype=np.float32) for document in documents],
+                )
+                if documents
+                else None
+            ),
+            "queries": [document["query"] for document in documents],
+            "answers": [document["answer"] for document in documents],
+        }
+
+    async def get(self, bot_id: str, version: str) -> dict:
+        key = (bot_id, version)
+        entry = self._entries.get(key)
+        if entry is None or entry["loaded_at"] + self.ttl_seconds < time.monotonic():
+            entry = await self._load(bot_id, version)
+            self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_bots:
+            self._entries.popitem(last=False)
+        return entry
+
+    def add(self, bot_id: str, version: str, query: str, vector: np.ndarray, answer: dict):
+        entry = self._entries.get((bot_id, version))
+        if entry is None:
+            return
+        vector = vector[np.newaxis, :]
+        entry["vectors"] = (
+            vector if entry["vectors"] is None else np.vstack([vector, entry["vectors"]])
+        )[: settings.answer_cache_max_entries_per_bot]
+        entry["queries"] = [query, *entry["queries"]][: len(entry["vectors"])]
+        entry["answers"] = [answer, *entry["answers"]][: len(entry["vectors"])]
+
+    def drop_bot(self, bot_id: str):
+        for key in [key for key in self._entries if key[0] == bot_id]:
+            del self._entries[key]
+
+
+answer_index = AnswerIndex()
+
+
+async def find_cached_answer(
+    bot_id: str,
+    version: str,
+    query_vector,
+) -> Optional[dict]:
+    """
+    The cached answer of the most similar earlier question to the same bot
+    and knowledge version, if its cosine similarity reaches
+    `answer_cache_threshold`.
+    """
+    try:
+        started_at = time.perf_counter()
+        entry = await answer_index.get(bot_id, version)
+        if entry["vectors"] is None:
+            answer_cache_metrics.misses += 1
+            return None
+
+        similarities = entry["vectors"] @ _normalize(query_vector)
+        best = int(np.argmax(similarities))
+        if similarities[best] < settings.answer_cache_threshold:
+            answer_cache_metrics.misses += 1
+            return None
+
+        answer_cache_metrics.hits += 1
+        logging.info(
+            f"Answer cache hit for bot {bot_id} "
+            f"(similarity {similarities[best]:.3f} to \"{entry['queries'][best]}\", "
+            f"{(time.perf_counter() - started_at) * 1000:.1f}ms)",
+        )
+        return entry["answers"][best]
+    except Exception as e:
+        logging.error(f"Error: answer cache lookup failed: {e}")
+        answer_cache_metrics.misses += 1
+        return None
+
+
+async def store_answer(
+    bot_id: str,
+    version: str,
+    query: str,
+    query_vector,
+    answer: dict,
+):
+    try:
+        vector = _normalize(query_vector)
+        collection = get_db().get_collection(COLLECTION_NAME)
+        await collection.insert_one(
+            {
+                "bot_id": bot_id,
+                "knowledge_version": version,
+                "query": query,
+                "vector": Binary(vector.tobytes()),
+                "answer": answer,
+                "created_at": datetime.now(timezone.utc),
+            },
+        )
+        answer_index.add(bot_id, version, query, vector, answer)
+        # Answers built from an older version of the bot's files can never
+        # match again.
+        await collection.delete_many(
+            {"bot_id": bot_id, "knowledge_version": {"$ne": version}},
+        )
+        answer_cache_metrics.stored += 1
+    except Exception as e:
+        logging.error(f"Error: answer cache store failed: {e}")
@@ -0,0 +1,147 @@
+import hashlib
+from functools import lru_cache
+from typing import Callable, List, Optional, Tuple
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter, TextSplitter
+
+from server.services.encoders import EMBEDDING_MODEL_NAME
+from server.settings import settings
+
+# Counts the tokens of each text.
+TokenCounter = Callable[[List[str]], List[int]]
+
+
+def chunk_hash(chunk: str) -> str:
+    return hashlib.sha256(chunk.encode("utf-8")).hexdigest()
+
+
+@lru_cache(maxsize=None)
+def _load_tokenizer(tokenizer_name: str):
+    if tokenizer_name == "embedding":
+        # Only the tokenizer files are loaded, not the model weights.
+        from transformers import AutoTokenizer
+
+        return AutoTokenizer.from_pretrained(EMBEDDING_MODEL_NAME, trust_remote_code=True)
+
+    import tiktoken
+
+    return tiktoken.get_encoding(tokenizer_name)
+
+
+def get_token_counter(tokenizer_name: str = settings.chunk_tokenizer) -> TokenCounter:
+    """
+    Token counter of `tokenizer_name`: "embedding" for the tokenizer of the
+    embedding model, or a tiktoken encoding name such as "cl100k_base".
+    """
+    tokenizer = _load_tokenizer(tokenizer_name)
+
+    def count_tokens(texts: List[str]) -> List[int]:
+        if not texts:
+            return []
+        if tokenizer_name == "embedding":
+            input_ids = tokenizer(texts, add_special_tokens=False)["input_ids"]
+        else:
+            input_ids = tokenizer.encode_batch(texts)
+        return [len(ids) for ids in input_ids]
+
+    return count_tokens
+
+
+@lru_cache(maxsize=None)
+def get_splitter(
+    chunk_size: int = settings.chunk_min_tokens,
+    chunk_overlap: int = settings.chunk_overlap_tokens,
+    tokenizer_name: str = settings.chunk_tokenizer,
+) -> TextSplitter:
+    """One splitter per configuration, shared by every assembler."""
+    tokenizer = _load_tokenizer(tokenizer_name)
+    if tokenizer_name == "embedding":
+        return RecursiveCharacterTextSplitter.from_huggingface_tokenizer(
+            tokenizer,
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+        )
+    return RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+        encoding_name=tokenizer_name,
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+    )
+
+
+class ChunkAssembler:
+    """
+    Groups sentences into chunks of `min_length` to `max_length` tokens.
+
+    Sentences are appended to a paragraph until it reaches `min_length`;
+    paragraphs longer than `max_length` are split with a shared recursive
+    splitter, a short trailing paragraph is merged into the previous one.
+
+    Sentences can be fed page by page; finished chunks are returned as soon
+    as they can no longer change. Paragraphs are kept as sentence lists
+    with a running token count and joined once, so the work is linear in
+    the size of the document.
+    """
+
+    def __init__(
+        self,
+        min_length: int = settings.chunk_min_tokens,
+        max_length: int = settings.chunk_max_tokens,
+        count_tokens: Optional[TokenCounter] = None,
+        splitter: Optional[TextSplitter] = None,
+    ):
+        self.min_length = min_length
+        self.max_length = max_length
+        self.count_tokens = count_tokens or get_token_counter()
+        self.splitter = splitter or get_splitter(chunk_size=min_length)
+        self.current_parts: List[str] = []
+        self.current_length = 0
+        self.pending_paragraph: Optional[Tuple[List[str], int]] = None
+
+    def _split_paragraph(self, paragraph: Tuple[List[str], int]) -> List[str]:
+        parts, length = paragraph
+        text = " ".join(parts)
+        if length > self.max_length:
+            return self.splitter.split_text(text)
+        return [text]
+
+    def _push_paragraph(self) -> List[str]:
+        chunks = []
+        if self.pending_paragraph is not None:
+            chunks = self._split_paragraph(self.pending_paragraph)
+        self.pending_paragraph = (self.current_parts, self.current_length)
+        self.current_parts, self.current_length = [], 0
+        return chunks
+
+    def feed(self, sentences: List[str]) -> List[str]:
+        chunks = []
+        for sentence, length in zip(sentences, self.count_tokens(sentences)):
+            if self.current_parts and self.current_length >= self.min_length:
+                chunks.extend(self._push_paragraph())
+            self.current_parts.append(sentence)
+            self.current_length += length
+        return chunks
+
+    def flush(self) -> List[str]:
+        chunks = []
+        if self.current_parts:
+            if self.current_length < self.min_length and self.pending_paragraph is not None:
+                parts, length = self.pending_paragraph
+                parts.extend(self.current_parts)
+                self.pending_paragraph = (parts, length + self.current_length)
+                self.current_parts, self.current_length = [], 0
+            else:
+                chunks.extend(self._push_paragraph())
+
+        if self.pending_paragraph is not None:
+            chunks.extend(self._split_paragraph(self.pending_paragraph))
+            self.pending_paragraph = None
+        return chunks
+
+
+def merge_sentences_into_chunks(
+    sentences: List[str],
+    min_length: int = settings.chunk_min_tokens,
+    max_length: int = settings.chunk_max_tokens,
+) -> List[str]:
+    assembler = ChunkAssembler(min_length=min_length, max_length=max_length)
+    return assembler.feed(sentences) + assembler.flush()
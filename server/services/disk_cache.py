@@ -0,0 +1,146 @@
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+from server.config.logging import logging
+from server.services.sqlite_connection import ProcessConnection
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at);
+CREATE TABLE IF NOT EXISTS stats (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    total_size INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO stats (id, total_size) VALUES (0, 0);
+CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON entries BEGIN
+    UPDATE stats SET total_size = total_size + new.size WHERE id = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS entries_update AFTER UPDATE OF size ON entries BEGIN
+    UPDATE stats SET total_size = total_size - old.size + new.size WHERE id = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON entries BEGIN
+    UPDATE stats SET total_size = total_size - old.size WHERE id = 0;
+END;
+"""
+
+# SQLite caps the number of bound parameters per statement.
+_MAX_KEYS_PER_QUERY = 500
+
+
+class DiskCache:
+    """
+    Size-bounded key/blob store on SQLite, shared by every process on the box.
+
+    Entries are evicted least recently used first once the stored values grow
+    past `max_bytes`. Hit and miss counters are kept per process.
+    """
+
+    def __init__(self, name: str, path: str, max_bytes: int):
+        self.name = name
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = ProcessConnection(path, _SCHEMA)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, bytes]:
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        try:
+            with self._lock:
+                connection = self._connection.get()
+                for start in range(0, len(keys), _MAX_KEYS_PER_QUERY):
+                    batch = keys[start : start + _MAX_KEYS_PER_QUERY]
+                    placeholders = ", ".join("?" * len(batch))
+                    rows = connection.execute(
+                        f"SELECT key, value FROM entries WHERE key IN ({placeholders})",
+                        batch,
+                    ).fetchall()
+                    found.update(rows)
+                    if rows:
+                        connection.execute(
+                            "UPDATE entries SET accessed_at = ? "
+                            f"WHERE key IN ({', '.join('?' * len(rows))})",
+                            [time.time(), *[key for key, _ in rows]],
+                        )
+        except sqlite3.Error as e:
+            logging.error(f"Error: {self.name} cache read failed: {e}")
+
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.get_many([key]).get(key)
+
+    def set_many(self, items: Dict[str, bytes]):
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            connection = None
+            try:
+                connection = self._connection.get()
+                connection.execute("BEGIN IMMEDIATE")
+                connection.executemany(
+                    "INSERT INTO entries (key, value, size, accessed_at) "
+                    "VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET value = excluded.value, "
+                    "size = excluded.size, accessed_at = excluded.accessed_at",
+                    [(key, value, len(value), now) for key, value in items.items()],
+                )
+                self._evict(connection)
+                connection.execute("COMMIT")
+            except sqlite3.Error as e:
+                logging.error(f"Error: {self.name} cache write failed: {e}")
+                if connection is not None and connection.in_transaction:
+                    connection.execute("ROLLBACK")
+
+    def set(self, key: str, value: bytes):
+        self.set_many({key: value})
+
+    def _evict(self, connection: sqlite3.Connection):
+        (total_size,) = connection.execute(
+            "SELECT total_size FROM stats WHERE id = 0",
+        ).fetchone()
+        if total_size <= self.max_bytes:
+            return
+
+        # Free a bit more than needed so eviction does not run on every write.
+        to_free = total_size - int(self.max_bytes * 0.9)
+        connection.execute(
+            "DELETE FROM entries WHERE key IN ("
+            "SELECT key FROM ("
+            "SELECT key, SUM(size) OVER ("
+            "ORDER BY accessed_at, key ROWS UNBOUNDED PRECEDING"
+            ") - size AS freed_before FROM entries"
+            ") WHERE freed_before < ?"
+            ")",
+            [to_free],
+        )
+        logging.info(f"{self.name} cache evicted entries to free {to_free} bytes")
+
+    def size(self) -> int:
+        with self._lock:
+            (total_size,) = (
+                self._connection.get()
+                .execute("SELECT total_size FROM stats WHERE id = 0")
+                .fetchone()
+            )
+        return total_size
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,231 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+import struct
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from server.config.logging import logging
+from server.settings import settings
+
+# Every message is a 4 byte big-endian length followed by the payload.
+_LENGTH = struct.Struct(">I")
+
+# True inside the embedding server process, which must encode locally.
+_serving = False
+
+
+class EmbeddingServerError(Exception):
+    """The embedding server failed to encode a request."""
+
+
+class EmbeddingServerUnavailable(ConnectionError):
+    """The embedding server could not be reached."""
+
+
+async def _read_frame(reader: asyncio.StreamReader) -> bytes:
+    (length,) = _LENGTH.unpack(await reader.readexactly(_LENGTH.size))
+    return await reader.readexactly(length)
+
+
+def _write_frame(writer: asyncio.StreamWriter, payload: bytes):
+    writer.write(_LENGTH.pack(len(payload)))
+    writer.write(payload)
+
+
+async def _encode_request(request: dict) -> np.ndarray:
+    from server.services.embedding_service import (
+        local_encode_query,
+        local_encode_texts,
+    )
+
+    texts = request["texts"]
+    if request["kind"] == "query":
+        # Queries from every uvicorn worker share the micro-batcher.
+        vectors = await asyncio.gather(*[local_encode_query(text) for text in texts])
+        return np.stack(vectors)
+    if request["kind"] == "documents":
+        return await local_encode_texts(texts)
+    raise ValueError(f"Unknown request kind: {request['kind']}")
+
+
+async def _handle_connection(
+    reader: asyncio.StreamReader,
+    writer: asyncio.StreamWriter,
+):
+    try:
+        while True:
+            try:
+                request = json.loads(await _read_frame(reader))
+            except asyncio.IncompleteReadError:
+                break
+
+            try:
+                vectors = np.ascontiguousarray(
+                    await _encode_request(request),
+                    dtype=np.float32,
+                )
+            except Exception as e:
+                logging.error(e)
+                _write_frame(writer, json.dumps({"error": str(e)}).encode())
+            else:
+                _write_frame(writer, json.dumps({"shape": vectors.shape}).encode())
+                _write_frame(writer, vectors.tobytes())
+            await writer.drain()
+    except (ConnectionError, asyncio.CancelledError):
+        pass
+    finally:
+        writer.close()
+
+
+async def _serve(socket_path: str, ready):
+    from server.services.embedding_service import get_encoder
+
+    encoder = get_encoder()
+
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    server = await asyncio.start_unix_server(_handle_connection, path=socket_path)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    logging.info(f"Embedding server for {encoder.name} listening on {socket_path}")
+    ready.set()
+    try:
+        async with server:
+            await stop.wait()
+    finally:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        logging.info("Embedding server stopped")
+
+
+def run_embedding_server(socket_path: str, ready):
+    """Entrypoint of the embedding server process."""
+    global _serving
+    _serving = True
+    asyncio.run(_serve(socket_path, ready))
+
+
+def start_embedding_server_process(
+    socket_path: str = settings.embedding_server_socket,
+    timeout: float = settings.embedding_server_start_timeout,
+) -> Optional[multiprocessing.Process]:
+    """
+    Start the embedding server and wait until it is listening.
+
+    Returns None when it did not come up in time; clients then encode in
+    their own process.
+    """
+    context = multiprocessing.get_context("spawn")
+    ready = context.Event()
+    process = context.Process(
+        target=run_embedding_server,
+        args=(socket_path, ready),
+        name="embedding-server",
+        daemon=True,
+    )
+    process.start()
+
+    deadline = time.monotonic() + timeout
+    while not ready.wait(1):
+        if not process.is_alive() or time.monotonic() > deadline:
+            logging.error(
+                "Error: embedding server did not start, "
+                "workers will load the model themselves",
+            )
+            stop_embedding_server_process(process, socket_path)
+            return None
+    return process
+
+
+def stop_embedding_server_process(
+    process: multiprocessing.Process,
+    socket_path: str = settings.embedding_server_socket,
+):
+    if process.is_alive():
+        process.terminate()
+        process.join(10)
+    if process.is_alive():
+        process.kill()
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+
+
+class EmbeddingClient:
+    """
+    Client of the embedding server, keeping a small pool of open connections.
+
+    When the server cannot be reached the client reports itself unavailable
+    for `retry_seconds`, and callers encode locally in the meantime.
+    """
+
+    def __init__(
+        self,
+        socket_path: str = settings.embedding_server_socket,
+        pool_size: int = settings.embedding_client_pool_size,
+        retry_seconds: float = settings.embedding_client_retry_seconds,
+    ):
+        self.socket_path = socket_path
+        self.pool_size = pool_size
+        self.retry_seconds = retry_seconds
+        self._idle: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+        self._retry_at = 0.0
+
+    def available(self) -> bool:
+        return (
+            settings.embedding_server_enabled
+            and not _serving
+            and time.monotonic() >= self._retry_at
+            and os.path.exists(self.socket_path)
+        )
+
+    async def _acquire(self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        if self._idle:
+            return self._idle.pop()
+        return await asyncio.open_unix_connection(self.socket_path)
+
+    def _release(self, connection: Tuple[asyncio.StreamReader, asyncio.StreamWriter]):
+        if len(self._idle) < self.pool_size:
+            self._idle.append(connection)
+        else:
+            connection[1].close()
+
+    async def encode(self, kind: str, texts: List[str]) -> np.ndarray:
+        try:
+            reader, writer = await self._acquire()
+            try:
+                _write_frame(
+                    writer,
+                    json.dumps({"kind": kind, "texts": texts}).encode("utf-8"),
+                )
+                await writer.drain()
+                header = json.loads(await _read_frame(reader))
+                if "error" not in header:
+                    payload = await _read_frame(reader)
+            except BaseException:
+                writer.close()
+                raise
+        except (OSError, asyncio.IncompleteReadError) as e:
+            self._retry_at = time.monotonic() + self.retry_seconds
+            logging.warning(
+                f"Embedding server unavailable ({e!r}), encoding locally "
+                f"for the next {self.retry_seconds:.0f}s",
+            )
+            raise EmbeddingServerUnavailable(str(e)) from e
+
+        self._release((reader, writer))
+        if "error" in header:
+            raise EmbeddingServerError(header["error"])
+        # frombuffer views are read-only, copy so callers own their vectors.
+        return np.frombuffer(payload, dtype=np.float32).reshape(header["shape"]).copy()
+
+
+embedding_client = EmbeddingClient()
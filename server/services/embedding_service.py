@@ -0,0 +1,313 @@
+import asyncio
+import hashlib
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+from server.config.logging import logging
+from server.services.disk_cache import DiskCache
+from server.services.encoders import Encoder, create_encoder, encoder_name
+from server.settings import settings
+
+
+class EmbeddingEngine:
+    """
+    Batched encoder for ingestion.
+
+    Texts are sorted by token length and grouped into batches whose padded
+    size (longest text x batch size) stays under `batch_tokens`, so short
+    chunks are not padded to the length of the longest one. Vectors are
+    returned in the original order.
+    """
+
+    def __init__(
+        self,
+        encoder: Encoder,
+        batch_tokens: int = settings.embedding_batch_tokens,
+        max_batch_size: int = settings.embedding_max_batch_size,
+    ):
+        self.encoder = encoder
+        self.batch_tokens = batch_tokens
+        self.max_batch_size = max_batch_size
+
+    def make_batches(self, lengths: List[int]) -> List[List[int]]:
+        order = sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True)
+
+        batches, batch, batch_max_length = [], [], 0
+        for i in order:
+            # Longest first, so the first text of a batch sets its padded length.
+            if batch and (
+                batch_max_length * (len(batch) + 1) > self.batch_tokens
+                or len(batch) >= self.max_batch_size
+            ):
+                batches.append(batch)
+                batch = []
+            if not batch:
+                batch_max_length = lengths[i]
+            batch.append(i)
+
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        vectors = np.empty((len(texts), self.encoder.dimension), dtype=np.float32)
+        if not texts:
+            return vectors
+
+        lengths = self.encoder.token_lengths(texts)
+        started_at = time.perf_counter()
+        for batch in self.make_batches(lengths):
+            batch_started_at = time.perf_counter()
+            vectors[batch] = self.encoder.encode(
+                [texts[i] for i in batch],
+                batch_size=len(batch),
+            )
+            elapsed = time.perf_counter() - batch_started_at
+            batch_tokens = sum(lengths[i] for i in batch)
+            logging.debug(
+                f"Encoded batch of {len(batch)} texts, {batch_tokens} tokens "
+                f"in {elapsed:.3f}s ({batch_tokens / elapsed:.0f} tokens/s)",
+            )
+
+        elapsed = time.perf_counter() - started_at
+        logging.info(
+            f"Encoded {len(texts)} texts, {sum(lengths)} tokens "
+            f"in {elapsed:.3f}s ({len(texts) / elapsed:.1f} texts/s)",
+        )
+        return vectors
+
+
+class QueryEncodeBatcher:
+    """
+    Coalesces concurrent single-query encodes into one forward pass.
+
+    Requests are collected until `max_batch_size` are waiting or `max_wait_ms`
+    has passed since the first one, then encoded together in the default
+    executor; each caller gets its own row back.
+    """
+
+    def __init__(
+        self,
+        encode_batch: Callable[[List[str]], np.ndarray],
+        max_batch_size: int = settings.query_batch_max_size,
+        max_wait_ms: float = settings.query_batch_max_wait_ms,
+    ):
+        self.encode_batch = encode_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._running = set()
+
+    async def encode(self, text: str) -> np.ndarray:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch: List[Tuple[str, asyncio.Future]]):
+        loop = asyncio.get_running_loop()
+        try:
+            vectors = await loop.run_in_executor(
+                None,
+                self.encode_batch,
+                [text for text, _ in batch],
+            )
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        logging.debug(f"Encoded {len(batch)} queries in one batch")
+        for (_, future), vector in zip(batch, vectors):
+            if not future.done():
+                future.set_result(vector)
+
+
+class QueryVectorCache:
+    """In-process LRU of query vectors with a TTL."""
+
+    def __init__(
+        self,
+        max_size: int = settings.query_cache_max_size,
+        ttl_seconds: float = settings.query_cache_ttl_seconds,
+    ):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] < time.monotonic():
+            del self._entries[key]
+            entry = None
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: str, vector: np.ndarray):
+        # Cached vectors are shared between callers.
+        vector.setflags(write=False)
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, vector)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+_encoder: Optional[Encoder] = None
+_embedding_engine: Optional[EmbeddingEngine] = None
+_query_batcher: Optional[QueryEncodeBatcher] = None
+
+query_cache = QueryVectorCache()
+
+embedding_cache = DiskCache(
+    name="Embedding",
+    path=settings.embedding_cache_path,
+    max_bytes=settings.embedding_cache_max_bytes,
+)
+
+
+def get_encoder() -> Encoder:
+    """Load the encoder on first use, so processes that only talk to the
+    embedding server never load the model weights."""
+    global _encoder, _embedding_engine, _query_batcher
+    if _encoder is None:
+        _encoder = create_encoder()
+        _embedding_engine = EmbeddingEngine(_encoder)
+        _query_batcher = QueryEncodeBatcher(
+            lambda texts: _encoder.encode(texts, batch_size=len(texts)),
+        )
+    return _encoder
+
+
+def get_embedding_engine() -> EmbeddingEngine:
+    get_encoder()
+    return _embedding_engine
+
+
+def get_query_batcher() -> QueryEncodeBatcher:
+    get_encoder()
+    return _query_batcher
+
+
+def embedding_cache_key(text):
+    normalized_text = " ".join(unicodedata.normalize("NFC", text).split())
+    return hashlib.sha256(
+        f"{encoder_name()}\0{normalized_text}".encode("utf-8"),
+    ).hexdigest()
+
+
+def _encode_texts_with_cache(texts):
+    keys = [embedding_cache_key(text) for text in texts]
+    cached_vectors = embedding_cache.get_many(keys)
+
+    missing_keys = {}
+    for key, text in zip(keys, texts):
+        if key not in cached_vectors:
+            missing_keys.setdefault(key, text)
+
+    if missing_keys:
+        encoded_vectors = get_embedding_engine().encode(list(missing_keys.values()))
+        new_vectors = {
+            key: vector.tobytes()
+            for key, vector in zip(missing_keys, encoded_vectors)
+        }
+        embedding_cache.set_many(new_vectors)
+        cached_vectors.update(new_vectors)
+
+    logging.debug(
+        f"Embedding cache hits {len(texts) - len(missing_keys)}/{len(texts)}, "
+        f"total {embedding_cache.stats()}",
+    )
+    return np.stack(
+        [np.frombuffer(cached_vectors[key], dtype=np.float32) for key in keys],
+    )
+
+
+async def local_encode_query(text):
+    return await get_query_batcher().encode(text)
+
+
+async def local_encode_texts(texts):
+    loop = asyncio.get_event_loop()
+    if not settings.embedding_cache_enabled:
+        return await loop.run_in_executor(None, get_embedding_engine().encode, texts)
+    return await loop.run_in_executor(None, _encode_texts_with_cache, texts)
+
+
+async def _encode_query(text):
+    from server.services.embedding_server import (
+        EmbeddingServerUnavailable,
+        embedding_client,
+    )
+
+    if embedding_client.available():
+        try:
+            return (await embedding_client.encode("query", [text]))[0]
+        except EmbeddingServerUnavailable:
+            pass
+    return await local_encode_query(text)
+
+
+async def model_encode_text(text):
+    key = embedding_cache_key(text)
+    vector = query_cache.get(key)
+    if vector is None:
+        vector = await _encode_query(text)
+        query_cache.set(key, vector)
+
+    lookups = query_cache.hits + query_cache.misses
+    if lookups % 1000 == 0:
+        logging.info(f"Query vector cache {query_cache.stats()}")
+    return vector
+
+
+async def model_encode_texts(texts):
+    from server.services.embedding_server import (
+        EmbeddingServerUnavailable,
+        embedding_client,
+    )
+
+    if embedding_client.available():
+        try:
+            return await embedding_client.encode("documents", texts)
+        except EmbeddingServerUnavailable:
+            pass
+    return await local_encode_texts(texts)
@@ -0,0 +1,181 @@
+import json
+import os
+from abc import ABC, abstractmethod
+from typing import List
+
+import numpy as np
+
+from server.settings import settings
+
+EMBEDDING_MODEL_NAME = "Alibaba-NLP/gte-multilingual-base"
+
+ONNX_MODEL_FILE = "model_quantized.onnx"
+
+
+def encoder_name(backend: str = settings.embedding_backend) -> str:
+    """Name of the vectors a backend produces, known without loading it."""
+    if backend == "onnx":
+        return f"{EMBEDDING_MODEL_NAME}:onnx-int8"
+    return EMBEDDING_MODEL_NAME
+
+
+class Encoder(ABC):
+    """Turns texts into L2-comparable float32 vectors."""
+
+    # Identifies the vectors an encoder produces, e.g. in cache keys.
+    name: str
+    dimension: int
+    max_seq_length: int
+
+    @abstractmethod
+    def token_lengths(self, texts: List[str]) -> List[int]:
+        """Number of tokens of each text, after truncation."""
+
+    @abstractmethod
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        """Encode texts into a (len(texts), dimension) float32 array."""
+
+
+class SentenceTransformerEncoder(Encoder):
+    """fp32 PyTorch backend."""
+
+    def __init__(
+        self,
+        model_name: str = EMBEDDING_MODEL_NAME,
+        max_seq_length: int = settings.embedding_max_seq_length,
+        num_threads: int = settings.embedding_num_threads,
+    ):
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        if num_threads > 0:
+            torch.set_num_threads(num_threads)
+
+        self.model = SentenceTransformer(model_name, trust_remote_code=True)
+        self.model.max_seq_length = max_seq_length
+        self.name = model_name
+        self.dimension = self.model.get_sentence_embedding_dimension()
+        self.max_seq_length = max_seq_length
+
+    def token_lengths(self, texts: List[str]) -> List[int]:
+        input_ids = self.model.tokenizer(
+            texts,
+            truncation=True,
+            max_length=self.max_seq_length,
+        )["input_ids"]
+        return [len(ids) for ids in input_ids]
+
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        return self.model.encode(
+            texts,
+            batch_size=batch_size,
+            convert_to_numpy=True,
+        ).astype(np.float32, copy=False)
+
+
+class OnnxEncoder(Encoder):
+    """
+    ONNX Runtime CPU backend for a model exported and int8 quantized by
+    `server/tests/onnx_encoder.py export`.
+
+    Pooling follows the sentence-transformers config copied next to the
+    model (CLS for gte-multilingual-base); vectors are L2 normalized.
+    """
+
+    def __init__(
+        self,
+        model_dir: str = settings.embedding_onnx_dir,
+        max_seq_length: int = settings.embedding_max_seq_length,
+        num_threads: int = settings.embedding_num_threads,
+    ):
+        try:
+            import onnxruntime
+        except ImportError as e:
+            raise ImportError(
+                "The onnx embedding backend needs `onnxruntime` installed",
+            ) from e
+        from transformers import AutoTokenizer
+
+        session_options = onnxruntime.SessionOptions()
+        if num_threads > 0:
+            session_options.intra_op_num_threads = num_threads
+        session_options.graph_optimization_level = (
+            onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        )
+
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(model_dir, ONNX_MODEL_FILE),
+            sess_options=session_options,
+            providers=["CPUExecutionProvider"],
+        )
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.mean_pooling = self._uses_mean_pooling(model_dir)
+
+        self.name = encoder_name("onnx")
+        self.dimension = self.session.get_outputs()[0].shape[-1]
+        self.max_seq_length = max_seq_length
+
+    @staticmethod
+    def _uses_mean_pooling(model_dir: str) -> bool:
+        pooling_config_path = os.path.join(model_dir, "1_Pooling", "config.json")
+        if not os.path.exists(pooling_config_path):
+            return False
+        with open(pooling_config_path) as f:
+            return bool(json.load(f).get("pooling_mode_mean_tokens"))
+
+    def token_lengths(self, texts: List[str]) -> List[int]:
+        input_ids = self.tokenizer(
+            texts,
+            truncation=True,
+            max_length=self.max_seq_length,
+        )["input_ids"]
+        return [len(ids) for ids in input_ids]
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        features = self.tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=self.max_seq_length,
+            return_tensors="np",
+        )
+        last_hidden_state = self.session.run(
+            None,
+            {
+                name: value.astype(np.int64)
+                for name, value in features.items()
+                if name in self.input_names
+            },
+        )[0]
+
+        if self.mean_pooling:
+            mask = features["attention_mask"][..., None].astype(np.float32)
+            vectors = (last_hidden_state * mask).sum(axis=1) / np.clip(
+                mask.sum(axis=1),
+                1e-9,
+                None,
+            )
+        else:
+            vectors = last_hidden_state[:, 0]
+
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return (vectors / np.clip(norms, 1e-12, None)).astype(np.float32)
+
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        if not texts:
+            return np.empty((0, self.dimension), dtype=np.float32)
+        return np.concatenate(
+            [
+                self._encode_batch(texts[start : start + batch_size])
+                for start in range(0, len(texts), batch_size)
+            ],
+        )
+
+
+def create_encoder(backend: str = settings.embedding_backend) -> Encoder:
+    if backend == "onnx":
+        return OnnxEncoder()
+    if backend == "torch":
+        return SentenceTransformerEncoder()
+    raise ValueError(f"Unknown embedding backend: {backend}")
@@ -0,0 +1,248 @@
+import asyncio
+import hashlib
+import io
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import AsyncIterator, List, Optional, Tuple
+
+import pymupdf
+import pytesseract
+from PIL import Image
+
+from server.config.logging import logging
+from server.services.disk_cache import DiskCache
+from server.settings import settings
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+ocr_cache = DiskCache(
+    name="OCR",
+    path=settings.ocr_cache_path,
+    max_bytes=settings.ocr_cache_max_bytes,
+)
+
+
+@dataclass
+class PageContent:
+    page_num: int
+    text: str
+    ocr_texts: List[str] = field(default_factory=list)
+
+    def to_text(self) -> str:
+        return "\n".join([self.text, *self.ocr_texts])
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        # Spawned children re-import the main module as `__mp_main__`;
+        # `python -m server.worker` keeps that module free of service imports,
+        # so they only load this module and its dependencies.
+        _process_pool = ProcessPoolExecutor(
+            max_workers=settings.extraction_processes,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _process_pool
+
+
+def shutdown_process_pool():
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+
+
+def _count_pages(pdf_path) -> int:
+    doc = pymupdf.open(pdf_path)
+    try:
+        return doc.page_count
+    finally:
+        doc.close()
+
+
+@lru_cache(maxsize=1)
+def _tesseract_version() -> str:
+    return str(pytesseract.get_tesseract_version())
+
+
+def ocr_cache_key(image_hash: str) -> str:
+    """Results depend on the image, the language and every engine setting."""
+    engine = "\0".join(
+        [
+            _tesseract_version(),
+            settings.ocr_lang,
+            settings.ocr_tesseract_config,
+            str(settings.ocr_max_dpi),
+        ],
+    )
+    return hashlib.sha256(f"{image_hash}\0{engine}".encode("utf-8")).hexdigest()
+
+
+def _ocr_image(image_hash: str, load_image) -> str:
+    key = ocr_cache_key(image_hash)
+    cached_text = ocr_cache.get(key)
+    if cached_text is not None:
+        return cached_text.decode("utf-8")
+
+    text = pytesseract.image_to_string(
+        load_image(),
+        lang=settings.ocr_lang,
+        config=settings.ocr_tesseract_config,
+    )
+    ocr_cache.set(key, text.encode("utf-8"))
+    return text
+
+
+def _page_needs_ocr(text: str) -> bool:
+    """A page needs OCR only when it has no usable text layer."""
+    return len(text.strip()) < settings.ocr_min_text_chars
+
+
+def _downscale_image(image: Image.Image, page, xref: int) -> Image.Image:
+    """Resample an image so it is not OCR'd above `ocr_max_dpi`."""
+    rects = page.get_image_rects(xref)
+    if not rects or rects[0].width <= 0:
+        return image
+
+    # Image rects are in points (1/72 inch) on the page.
+    dpi = image.width / (rects[0].width / 72)
+    if dpi <= settings.ocr_max_dpi:
+        return image
+
+    scale = settings.ocr_max_dpi / dpi
+    return image.resize(
+        (max(1, int(image.width * scale)), max(1, int(image.height * scale))),
+        Image.LANCZOS,
+    )
+
+
+def _ocr_page(doc, page, seen_xrefs: set, seen_hashes: set) -> List[str]:
+    """
+    OCR the images of a page that has no text layer.
+
+    Images already seen in this shard (same xref or same bytes, e.g. a logo
+    repeated on every page) and images too small to carry text are skipped.
+    Pages made only of vector drawings are rasterized instead.
+    """
+    ocr_texts = []
+    has_images = False
+    for img in page.get_images(full=True):
+        xref, width, height = img[0], img[2], img[3]
+        has_images = True
+        if xref in seen_xrefs:
+            continue
+        seen_xrefs.add(xref)
+        if min(width, height) < settings.ocr_min_image_size:
+            continue
+
+        image_bytes = doc.extract_image(xref)["image"]
+        image_hash = hashlib.sha256(image_bytes).hexdigest()
+        if image_hash in seen_hashes:
+            continue
+        seen_hashes.add(image_hash)
+
+        ocr_texts.append(
+            _ocr_image(
+                image_hash,
+                lambda: _downscale_image(
+                    Image.open(io.BytesIO(image_bytes)),
+                    page,
+                    xref,
+                ),
+            ),
+        )
+
+    if not has_images and page.get_drawings():
+        page_png = page.get_pixmap(dpi=settings.ocr_max_dpi).tobytes("png")
+        ocr_texts.append(
+            _ocr_image(
+                hashlib.sha256(page_png).hexdigest(),
+                lambda: Image.open(io.BytesIO(page_png)),
+            ),
+        )
+
+    return ocr_texts
+
+
+def _extract_pages(
+    pdf_path,
+    start: int,
+    stop: int,
+) -> Tuple[List[PageContent], Tuple[int, int]]:
+    """
+    Extract the text layer of pages [start, stop) and OCR those without one.
+
+    Also returns the OCR cache (hits, misses) of the shard, since the
+    counters live in the child process.
+    """
+    hits, misses = ocr_cache.hits, ocr_cache.misses
+    doc = pymupdf.open(pdf_path)
+    pages = []
+    seen_xrefs, seen_hashes = set(), set()
+    try:
+        for page_num in range(start, stop):
+            page = doc[page_num]
+            text = page.get_text()
+            ocr_texts = []
+            if _page_needs_ocr(text):
+                ocr_texts = _ocr_page(doc, page, seen_xrefs, seen_hashes)
+            pages.append(PageContent(page_num, text, ocr_texts))
+    finally:
+        doc.close()
+    return pages, (ocr_cache.hits - hits, ocr_cache.misses - misses)
+
+
+async def iter_pages(pdf_path) -> AsyncIterator[PageContent]:
+    """
+    Yield every page of a document in order, sharded across the process pool.
+
+    Pages are split into ranges of `extraction_pages_per_task` so each child
+    opens the document once per shard. At most `extraction_processes` shards
+    are in flight, so extracted pages never pile up ahead of the consumer.
+    """
+    loop = asyncio.get_running_loop()
+    pool = get_process_pool()
+
+    page_count = await loop.run_in_executor(pool, _count_pages, pdf_path)
+    step = max(1, settings.extraction_pages_per_task)
+    shard_starts = iter(range(0, page_count, step))
+    in_flight = deque()
+
+    def submit_next_shard():
+        start = next(shard_starts, None)
+        if start is not None:
+            in_flight.append(
+                loop.run_in_executor(
+                    pool,
+                    _extract_pages,
+                    pdf_path,
+                    start,
+                    min(start + step, page_count),
+                ),
+            )
+
+    for _ in range(max(1, settings.extraction_processes)):
+        submit_next_shard()
+
+    ocr_hits, ocr_misses = 0, 0
+    try:
+        while in_flight:
+            shard, (shard_hits, shard_misses) = await in_flight.popleft()
+            ocr_hits += shard_hits
+            ocr_misses += shard_misses
+            submit_next_shard()
+            for page in shard:
+                yield page
+    finally:
+        for future in in_flight:
+            future.cancel()
+
+    ocr_lookups = ocr_hits + ocr_misses
+    logging.info(
+        f"Extracted {page_count} pages from {pdf_path}, "
+        f"OCR cache hits {ocr_hits}/{ocr_lookups} "
+        f"({ocr_hits / ocr_lookups if ocr_lookups else 0.0:.0%})",
+    )
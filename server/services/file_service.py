@@ -1,35 +1,79 @@
 import asyncio
-import io
 import os
-from typing import List
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
 from uuid import uuid4
 
-import pymupdf
-import pytesseract
 from bson import ObjectId
 from fastapi import UploadFile
 from langchain.schema import Document
 
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from PIL import Image
 from pymilvus import Collection
+from pymongo import ReturnDocument
 from pymongo.collection import Collection
 
 from server.config.logging import logging
-from server.config.milvusdb import get_milvusdb
+from server.config.milvusdb import (
+    PARTITION_KEY_FIELD,
+    get_milvusdb,
+    milvus_manager,
+    search_params,
+)
 from server.config.mongodb import get_db
-from server.web.api.file.schema import FileSchema, FileStatus
+from server.services.chunker import chunk_hash
+from server.services.hybrid_search import fuse_hits, retrieval_metrics
+from server.services.job_queue import enqueue_ingestion_job
+from server.services.lexical_index import lexical_index, safe_index_call
+from server.services.reranker import rerank_hits
+from server.services.upload_service import UploadTooLargeError, save_upload_file
+from server.settings import settings
+from server.web.api.file.schema import FileSchema, FileStatus, JobKind
+from server.web.api.package.service import get_user_package
 
 
 import re
 
-from sentence_transformers import SentenceTransformer
+from server.services.embedding_service import model_encode_text
 
-model = SentenceTransformer("Alibaba-NLP/gte-multilingual-base",  trust_remote_code=True)
 
+class FileBusyError(Exception):
+    """The file is being indexed and cannot be changed right now."""
 
 
-async def insert_file(file: UploadFile, user_id: str) -> FileSchema:
+async def get_remaining_file_capacity(user_id: str):
+    """Bytes the user can still upload under their package, None if unlimited."""
+    existing_package = await get_user_package(user_id)
+    if not existing_package:
+        return None
+
+    files_collection = get_db().get_collection("files")
+    result = await files_collection.aggregate(
+        [
+            {"$match": {"owner": user_id, "disabled": False}},
+            {"$group": {"_id": None, "total_size": {"$sum": "$size"}}},
+        ],
+    ).to_list(length=1)
+    total_size = result[0]["total_size"] if result else 0
+    return max(0, existing_package.get("capacity_file", 0) - total_size)
+
+
+def exceeds_remaining_capacity(
+    files: List[UploadFile],
+    remaining_capacity: Optional[int],
+) -> bool:
+    """Whether the declared sizes of an upload batch exceed the remaining
+    capacity. Files without a declared size are checked while saving."""
+    if remaining_capacity is None:
+        return False
+    return sum(file.size or 0 for file in files) > remaining_capacity
+
+
+async def insert_file(
+    file: UploadFile,
+    user_id: str,
+    max_bytes: Optional[int] = None,
+) -> FileSchema:
     try:
 
         files_collection: Collection = get_db().get_collection("files")
@@ -40,31 +84,88 @@ async def insert_file(file: UploadFile, user_id: str) -> FileSchema:
         file_uuid = uuid4()
         file_path = os.path.join(save_dir, f"{file_uuid}{file_extension}")
 
+        saved_upload = await save_upload_file(file, file_path, max_bytes=max_bytes)
+
+        file_object_id = ObjectId()
         file_new = FileSchema(
+            _id=file_object_id,
             name=file_name,
             extension=file_extension[1:],
-            size=file.size,
+            size=saved_upload.size,
             path=file_path,
             owner=user_id,
             status=FileStatus.loading,
+            content_hash=saved_upload.content_hash,
         )
 
-        await file.seek(0)
-        with open(file_path, "wb") as f:
-            f.write(await file.read())
-
-        result_file = await files_collection.insert_one(
-            file_new.model_dump(by_alias=True, exclude=["id"]),
-        )
-        inserted_file = FileSchema(
-            **await files_collection.find_one({"_id": result_file.inserted_id})
+        # Stored before any chunk is copied under its id, so copied chunks
+        # never outlive a failed insert.
+        await files_collection.insert_one(
+            {
+                "_id": file_object_id,
+                **file_new.model_dump(by_alias=True, exclude=["id"]),
+            },
         )
 
-        asyncio.create_task(insert_docs(inserted_file))
-        return inserted_file
+        ingested_file = await find_ingested_file_by_hash(file_new.content_hash, user_id)
+        if ingested_file and await reuse_ingested_file(ingested_file, file_new):
+            logging.info(
+                f"File {file_new.id} reuses the vectors of "
+                f"file {ingested_file['_id']}",
+            )
+        else:
+            await enqueue_ingestion_job(file_new)
+
+        return FileSchema(**await files_collection.find_one({"_id": file_object_id}))
 
+    except UploadTooLargeError:
+        raise
+    except Exception as e:
+        logging.error(e)
+
+
+async def reuse_ingested_file(ingested_file: dict, file: FileSchema) -> bool:
+    """
+    Copy the chunks of an ingested file with the same content to `file`,
+    stored in the loading state, and mark it successful. On failure the
+    copied chunks are deleted, so the file can be ingested on its own.
+    """
+    if not await copy_docs_to_file(str(ingested_file["_id"]), file):
+        return False
+    try:
+        await get_db().get_collection("files").update_one(
+            {"_id": ObjectId(file.id)},
+            {"$set": {"status": FileStatus.success}},
+        )
     except Exception as e:
         logging.error(e)
+        delete_docs_by_file_id(file.id)
+        return False
+    return True
+
+
+async def ensure_file_indexes():
+    files_collection = get_db().get_collection("files")
+    await files_collection.create_index(
+        [("owner", 1), ("content_hash", 1), ("status", 1)],
+    )
+
+
+async def find_ingested_file_by_hash(content_hash, owner, exclude_file_id=None):
+    """
+    An ingested file of `owner` with this content. Only the owner's own
+    files are reused, so an instant upload never reveals that another
+    user holds the same document.
+    """
+    files_collection = get_db().get_collection("files")
+    search_query = {
+        "content_hash": content_hash,
+        "owner": owner,
+        "status": FileStatus.success,
+    }
+    if exclude_file_id:
+        search_query["_id"] = {"$ne": ObjectId(exclude_file_id)}
+    return await files_collection.find_one(search_query)
 
 
 async def delete_file_by_file_id(file_id: str, user_id: str) -> bool:
@@ -109,97 +210,6 @@ async def delete_file_by_file_id(file_id: str, user_id: str) -> bool:
         logging.error(e)
         return False
 
-    
-
-
-async def extract_text_from_pdf(pdf_path):
-    loop = asyncio.get_event_loop()
-    text = await loop.run_in_executor(None, _extract_text_from_pdf, pdf_path)
-    return text
-
-def _extract_text_from_pdf(pdf_path):
-    doc = pymupdf.open(pdf_path)
-    text = ""
-    for page_num in range(doc.page_count):
-        page = doc[page_num]
-        text += " " + page.get_text()
-    doc.close()
-    return text
-
-async def extract_images_from_pdf(pdf_path):
-    loop = asyncio.get_event_loop()
-    images = await loop.run_in_executor(None, _extract_images_from_pdf, pdf_path)
-    return images
-
-def _extract_images_from_pdf(pdf_path):
-    doc = pymupdf.open(pdf_path)
-    images = []
-    for i in range(len(doc)):
-        for img in doc.get_page_images(i):
-            base_image = doc.extract_image(img[0])
-            images.append(base_image["image"])
-    doc.close()
-    return images
-
-async def ocr_from_images(images):
-    loop = asyncio.get_event_loop()
-    texts = await loop.run_in_executor(None, _ocr_from_images, images)
-    return texts
-
-def _ocr_from_images(images):
-    texts = []
-    for img_data in images:
-        image = Image.open(io.BytesIO(img_data))
-        text = pytesseract.image_to_string(image, lang="vie")
-        texts.append(text)
-    return texts
-
-async def extract_all_content(pdf_path):
-    text = await extract_text_from_pdf(pdf_path)
-    images = await extract_images_from_pdf(pdf_path)
-    ocr_texts = await ocr_from_images(images)
-
-    all_text = text + "\n" + "\n".join(ocr_texts)
-    return all_text
-
-
-def merge_sentences_into_chunks(sentences, min_length=500, max_length=800):
-    paragraphs = []
-    current_sentence = ""
-
-    for sentence in sentences:
-        if len(current_sentence) < min_length:
-            if current_sentence:
-                current_sentence += " " + sentence
-            else:
-                current_sentence = sentence
-        else:
-            paragraphs.append(current_sentence)
-            current_sentence = sentence
-
-    if current_sentence:
-        if len(current_sentence) < min_length and paragraphs:
-            paragraphs[-1] += " " + current_sentence
-        else:
-            paragraphs.append(current_sentence)
-
-    chunks = []
-    for paragraph in paragraphs:
-        paragraph_length = len(paragraph)
-        print(f"Paragraph lenght:  {paragraph_length}")
-
-        if paragraph_length > max_length:
-            ext_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=min_length,
-                chunk_overlap=50,
-            )
-            chunks.extend(ext_splitter.split_text(paragraph))
-        else:
-            chunks.append(paragraph)
-            
-
-    return chunks
-
 
 def split_content_to_sentences(content):
     content = content.strip().replace("\n", " ")
@@ -207,31 +217,50 @@ def split_content_to_sentences(content):
     return sentences
 
 
-async def model_encode_text(text):
-    loop = asyncio.get_event_loop()
-    result =  await loop.run_in_executor(None, lambda: model.encode([text]))
-    return result[0]
+def _with_owner(doc, owner):
+    # Only collections created with the owner partition key have the field.
+    if milvus_manager.partitioned:
+        doc[PARTITION_KEY_FIELD] = owner or ""
+    return doc
 
-async def model_encode_texts(texts):
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(None, lambda: model.encode(texts))
 
-async def insert_to_milvus_by_file(file, chunks, vectors):
+def _owner_filter(owners):
+    if not milvus_manager.partitioned or not owners:
+        return ""
+    owners_expr = ", ".join(f'"{owner}"' for owner in owners)
+    return f"{PARTITION_KEY_FIELD} in [{owners_expr}] && "
+
+
+def _insert_file_chunks(file, chunks, vectors):
     db = get_milvusdb()
 
     db.insert(
         [
-            {
-                "text": chunk,
-                "vector": vector,
-                "file_name": file.name,
-                "file_id": file.id,
-            }
+            _with_owner(
+                {
+                    "text": chunk,
+                    "vector": vector,
+                    "file_name": file.name,
+                    "file_id": file.id,
+                },
+                file.owner,
+            )
             for i, (chunk, vector) in enumerate(zip(chunks, vectors))
         ],
     )
+    milvus_manager.mark_written(len(chunks))
+    safe_index_call(lexical_index.add_chunks, file.id, file.name, chunks)
+
 
-    db.load()
+async def insert_to_milvus_by_file(file, chunks, vectors):
+    # Off the event loop, which also renews the ingestion job's lease.
+    await asyncio.get_event_loop().run_in_executor(
+        None,
+        _insert_file_chunks,
+        file,
+        chunks,
+        vectors,
+    )
     logging.info("Inserted chunks to milvus successfully")
 
 
@@ -240,56 +269,198 @@ async def insert_to_milvus_by_chat_id(chunk, vector, chat_id):
     if db is None:
         return
     db.insert(
-        {
-            "text": chunk,
-            "vector": vector,
-            "file_name": "",
-            "file_id": "",
-        },
+        _with_owner(
+            {
+                "text": chunk,
+                "vector": vector,
+                "file_name": "",
+                "file_id": "",
+            },
+            None,
+        ),
     )
-    db.load()
+    milvus_manager.mark_written()
 
     logging.info("Inserted chunks to milvus successfully")
 
 
 async def insert_docs(file: FileSchema):
-    from server.config.socketio import socketio_app
+    """
+    Extract, embed and index a file, then mark it as successful.
+
+    Runs inside the ingestion worker; errors are left to the caller so the
+    job can be retried.
+    """
+    from server.services.ingestion_pipeline import run_ingestion_pipeline
+
     db = get_db()
     files_collection = db.get_collection("files")
 
-    try:
-        
-        all_content = await extract_all_content(file.path) 
-        sentences =  split_content_to_sentences(all_content)
-        chunks =  merge_sentences_into_chunks(sentences)
-
-        vectors = await model_encode_texts(chunks)
-        print(f"Tên file: {file.name} --- Số chunks {len(chunks)}")
-        for chunk in chunks: 
-            print(f"Chunk: {chunk}")
-            print(f"Length of chunk: {len(chunk)}\n")
-        await insert_to_milvus_by_file(file, chunks, vectors)
-        await files_collection.update_one(
-            {"_id": ObjectId(file.id)},
-            {"$set": {"status": FileStatus.success}},
-        )
-        await socketio_app.send_file_status(
-            receiver_id=file.owner,
-            file_id=file.id,
-            status=FileStatus.success,
+    # An identical file may have finished ingesting while this one was queued.
+    ingested_file = None
+    if file.content_hash:
+        ingested_file = await find_ingested_file_by_hash(
+            file.content_hash,
+            file.owner,
+            exclude_file_id=file.id,
         )
 
-    except Exception as e:
-        logging.error(e)
-        await files_collection.update_one(
-            {"_id": ObjectId(file.id)},
-            {"$set": {"status": FileStatus.error}},
+    if ingested_file and await copy_docs_to_file(str(ingested_file["_id"]), file):
+        logging.info(
+            f"File {file.id} reuses the vectors of file {ingested_file['_id']}",
         )
-        await socketio_app.send_file_status(
-            receiver_id=file.owner,
-            file_id=file.id,
-            status=FileStatus.error,
+    else:
+        chunk_count = await run_ingestion_pipeline(file)
+        logging.info(f"Tên file: {file.name} --- Số chunks {chunk_count}")
+
+    # Persist the whole file before it is reported as ingested.
+    await asyncio.get_event_loop().run_in_executor(None, milvus_manager.flush)
+
+    await files_collection.update_one(
+        {"_id": ObjectId(file.id)},
+        {"$set": {"status": FileStatus.success}},
+    )
+
+
+def _load_chunk_ids_by_hash(file_id) -> Dict[str, List[int]]:
+    milvusdb = get_milvusdb()
+    iterator = milvusdb.query_iterator(
+        batch_size=settings.milvus_insert_batch_size,
+        expr=f'file_id == "{file_id}"',
+        output_fields=["id", "text"],
+    )
+    chunk_ids = defaultdict(list)
+    try:
+        while docs := iterator.next():
+            for doc in docs:
+                chunk_ids[chunk_hash(doc["text"])].append(doc["id"])
+    finally:
+        iterator.close()
+    return chunk_ids
+
+
+def _delete_docs_by_ids(ids):
+    milvusdb = get_milvusdb()
+    for start in range(0, len(ids), settings.milvus_insert_batch_size):
+        batch = ids[start : start + settings.milvus_insert_batch_size]
+        milvusdb.delete(expr=f"id in [{', '.join(str(id) for id in batch)}]")
+    milvus_manager.mark_written(len(ids))
+
+
+async def reindex_docs(file: FileSchema):
+    """
+    Bring the chunks of a replaced file in line with its new content.
+
+    The new version is re-chunked and each chunk hashed; chunks already stored
+    for the file are kept, only new ones are embedded and inserted, and stored
+    chunks that no longer occur are deleted. Safe to retry: a retry finds what
+    an interrupted attempt inserted and keeps it.
+    """
+    from server.services.ingestion_pipeline import run_ingestion_pipeline
+
+    loop = asyncio.get_event_loop()
+    stored_chunk_ids = await loop.run_in_executor(
+        None,
+        _load_chunk_ids_by_hash,
+        file.id,
+    )
+    stored_count = sum(len(ids) for ids in stored_chunk_ids.values())
+
+    def is_stored(chunk):
+        # Each stored copy matches one occurrence, repeated chunks included.
+        ids = stored_chunk_ids.get(chunk_hash(chunk))
+        if ids:
+            ids.pop()
+            return True
+        return False
+
+    inserted_count = await run_ingestion_pipeline(file, skip_chunk=is_stored)
+
+    vanished_ids = [id for ids in stored_chunk_ids.values() for id in ids]
+    if vanished_ids:
+        await loop.run_in_executor(None, _delete_docs_by_ids, vanished_ids)
+        safe_index_call(
+            lexical_index.delete_chunks,
+            file.id,
+            {hash_: len(ids) for hash_, ids in stored_chunk_ids.items() if ids},
         )
+    await loop.run_in_executor(None, milvus_manager.flush)
+
+    logging.info(
+        f"Reindexed file {file.id} version {file.version}: "
+        f"kept {stored_count - len(vanished_ids)}, inserted {inserted_count}, "
+        f"deleted {len(vanished_ids)} chunks",
+    )
+
+    await get_db().get_collection("files").update_one(
+        {"_id": ObjectId(file.id), "version": file.version},
+        {"$set": {"status": FileStatus.success}},
+    )
+
+
+async def replace_file_content(
+    file_id: str,
+    file: UploadFile,
+    user_id: str,
+    max_bytes: Optional[int] = None,
+) -> Optional[FileSchema]:
+    """
+    Swap the content of a file in place and queue a diff reindex.
+
+    The file keeps its id, so bots that list it keep working. Returns None
+    when the user has no such file. Raises FileBusyError while the file is
+    still being indexed.
+    """
+    files_collection: Collection = get_db().get_collection("files")
+    existing_file = await files_collection.find_one(
+        {"_id": ObjectId(file_id), "owner": user_id, "disabled": False},
+    )
+    if not existing_file:
+        return None
+
+    old_file = FileSchema(**existing_file)
+    if old_file.status == FileStatus.loading:
+        raise FileBusyError(f"File {file_id} is still being indexed")
+
+    if max_bytes is not None:
+        # The old content no longer counts against the package once replaced.
+        max_bytes += old_file.size or 0
+
+    _, file_extension = os.path.splitext(file.filename)
+    save_dir = os.path.join("server/stores/file/")
+    os.makedirs(save_dir, exist_ok=True)
+    file_path = os.path.join(save_dir, f"{uuid4()}{file_extension}")
+    saved_upload = await save_upload_file(file, file_path, max_bytes=max_bytes)
+
+    if saved_upload.content_hash == old_file.content_hash:
+        os.remove(file_path)
+        return old_file
+
+    updated_file = await files_collection.find_one_and_update(
+        {"_id": ObjectId(file_id), "version": old_file.version},
+        {
+            "$set": {
+                "path": file_path,
+                "extension": file_extension[1:],
+                "size": saved_upload.size,
+                "content_hash": saved_upload.content_hash,
+                "status": FileStatus.loading,
+            },
+            "$inc": {"version": 1},
+        },
+        return_document=ReturnDocument.AFTER,
+    )
+    if updated_file is None:
+        # Replaced concurrently by another request.
+        os.remove(file_path)
+        raise FileBusyError(f"File {file_id} was replaced concurrently")
+
+    if old_file.path and os.path.exists(old_file.path):
+        os.remove(old_file.path)
+
+    new_file = FileSchema(**updated_file)
+    await enqueue_ingestion_job(new_file, kind=JobKind.reindex)
+    return new_file
 
 
 async def insert_doc_by_qa_and_chat_id(question, answer, chat_id):
@@ -299,50 +470,127 @@ async def insert_doc_by_qa_and_chat_id(question, answer, chat_id):
 
 
 
+def _vector_search(query_vector, file_ids, owners, limit):
+    db = get_milvusdb()
+    file_ids_expr = ", ".join(f'"{file_id}"' for file_id in file_ids)
+    search_results = db.search(
+        expr=f"{_owner_filter(owners)}file_id in [{file_ids_expr}]",
+        output_fields=["id", "file_name", "file_id", "text"],
+        data=[query_vector],
+        anns_field="vector",
+        param=search_params(limit),
+        limit=limit,
+    )
+    return [
+        {
+            "text": hit.entity.get("text"),
+            "file_name": hit.entity.get("file_name"),
+            "file_id": hit.entity.get("file_id"),
+            "distance": hit.distance,
+        }
+        for result in search_results
+        for hit in result
+    ]
+
+
+def _hit_key(hit):
+    return hit["file_id"], chunk_hash(hit["text"])
+
+
 async def get_similar_docs_by_file_ids(
     query: str,
     file_ids: List[str],
     top_k: int = 5,
+    owners: Optional[List[str]] = None,
+    hybrid: bool = False,
+    rerank: Optional[bool] = None,
 ):
+    """
+    Search the chunks of the given files.
+
+    `owners` are the owners of those files; on a partitioned collection the
+    search is then limited to their partitions. With `hybrid`, BM25 hits from
+    the lexical index are fused with the vector hits by reciprocal rank, so
+    exact codes, names and numbers are found even when their embedding is
+    not close to the query's. With `rerank` (default `rerank_enabled`),
+    `rerank_candidates` hits are retrieved and a cross-encoder keeps the
+    best `top_k` of them.
+    """
 
     try:
-        query_vector =await model_encode_text(query)
-
-        db = get_milvusdb()
+        loop = asyncio.get_event_loop()
+        started_at = time.perf_counter()
+        query_vector = await model_encode_text(query)
 
-        file_ids_expr = ", ".join(f'"{file_id}"' for file_id in file_ids)
-        search_results = None
-    
-        search_results = db.search(
-            expr=f"file_id in [{file_ids_expr}]",
-            output_fields=["id", "file_name", "file_id", "text"],
-            data=[query_vector],
-            anns_field="vector",
-            param={"metric_type": "COSINE" },
-            limit=5,
+        hybrid = hybrid and settings.lexical_index_enabled
+        rerank = settings.rerank_enabled if rerank is None else rerank
+        # Hits kept for the rerank stage, or returned as they are.
+        result_count = max(top_k, settings.rerank_candidates) if rerank else top_k
+        candidate_count = (
+            max(result_count, settings.hybrid_candidates) if hybrid else result_count
         )
 
-        docs = []
+        latencies = {}
 
-        for result in search_results:
-            for hit in result:
-                text = hit.entity.get("text")
-                file_name = hit.entity.get("file_name")
-                file_id = hit.entity.get("file_id")
-                distance = hit.distance
-                
-                docs.append(
-                    Document(
-                        text,
-                        metadata={
-                            "file_name": file_name,
-                            "file_id": file_id,
-                            "distance": distance,
-                        },
-                    ),
-                )
+        async def timed(name, function, *args):
+            stage_started_at = time.perf_counter()
+            result = await loop.run_in_executor(None, function, *args)
+            latencies[name] = time.perf_counter() - stage_started_at
+            return result
 
-        return docs
+        searches = [
+            timed("vector", _vector_search, query_vector, file_ids, owners, candidate_count),
+        ]
+        if hybrid:
+            searches.append(
+                timed("lexical", lexical_index.search, query, file_ids, candidate_count),
+            )
+        results = await asyncio.gather(*searches)
+
+        vector_hits = results[0]
+        if hybrid:
+            lexical_hits = results[1]
+            hits = fuse_hits(vector_hits, lexical_hits, key=_hit_key, limit=result_count)
+        else:
+            lexical_hits = []
+            hits = vector_hits[:result_count]
+
+        if rerank:
+            rerank_started_at = time.perf_counter()
+            hits = await rerank_hits(query, hits, top_k)
+            latencies["rerank"] = time.perf_counter() - rerank_started_at
+
+        lexical_only = 0
+        if hybrid:
+            vector_keys = {_hit_key(hit) for hit in vector_hits}
+            lexical_only = sum(1 for hit in hits if _hit_key(hit) not in vector_keys)
+
+        latencies["total"] = time.perf_counter() - started_at
+        retrieval_metrics.record(
+            hybrid,
+            latencies,
+            returned=len(hits),
+            lexical=len(lexical_hits),
+            lexical_only=lexical_only,
+        )
+
+        return [
+            Document(
+                hit["text"],
+                metadata={
+                    "file_name": hit["file_name"],
+                    "file_id": hit["file_id"],
+                    "distance": hit.get("distance"),
+                    **({"rrf_score": hit["rrf_score"]} if "rrf_score" in hit else {}),
+                    **(
+                        {"rerank_score": hit["rerank_score"]}
+                        if "rerank_score" in hit
+                        else {}
+                    ),
+                },
+            )
+            for hit in hits
+        ]
     except Exception as e:
         print(f"Error: {e}")
 
@@ -356,7 +604,7 @@ async def get_history_docs_by_chat_id(query: str, chat_id: str, top_k: int = 5):
             output_fields=["id", "file_name", "file_id", "text"],
             data=[query_vector],
             anns_field="vector",
-            param={"metric_type": "COSINE",},
+            param=search_params(top_k),
             limit=top_k,
             expr=f"chat_id == '{chat_id}'",
         )
@@ -404,6 +652,63 @@ def get_docs_by_file_id(file_id):
     return docs
 
 
+def _copy_docs(source_file_id, file: FileSchema):
+    milvusdb = get_milvusdb()
+    iterator = milvusdb.query_iterator(
+        batch_size=settings.milvus_insert_batch_size,
+        expr=f'file_id == "{source_file_id}"',
+        output_fields=["text", "vector"],
+    )
+    copied_count = 0
+    try:
+        while docs := iterator.next():
+            milvusdb.insert(
+                [
+                    _with_owner(
+                        {
+                            "text": doc["text"],
+                            "vector": doc["vector"],
+                            "file_name": file.name,
+                            "file_id": file.id,
+                        },
+                        file.owner,
+                    )
+                    for doc in docs
+                ],
+            )
+            milvus_manager.mark_written(len(docs))
+            safe_index_call(
+                lexical_index.add_chunks,
+                file.id,
+                file.name,
+                [doc["text"] for doc in docs],
+            )
+            copied_count += len(docs)
+    finally:
+        iterator.close()
+    return copied_count
+
+
+async def copy_docs_to_file(source_file_id, file: FileSchema) -> bool:
+    """
+    Reuse the chunks and vectors of an already ingested file with the same
+    content instead of extracting and embedding it again.
+    """
+    try:
+        loop = asyncio.get_event_loop()
+        copied_count = await loop.run_in_executor(
+            None,
+            _copy_docs,
+            source_file_id,
+            file,
+        )
+        return copied_count > 0
+    except Exception as e:
+        logging.error(e)
+        delete_docs_by_file_id(file.id)
+        return False
+
+
 def delete_docs_by_file_id(file_id):
     try:
         milvusdb = get_milvusdb()
@@ -411,8 +716,8 @@ def delete_docs_by_file_id(file_id):
         milvusdb.delete(
             expr=f'file_id == "{file_id}"',
         )
-        milvusdb.flush()
-        milvusdb.load()
+        milvus_manager.mark_written()
+        safe_index_call(lexical_index.delete_file, file_id)
         return True
     except Exception as e:
         return False
@@ -0,0 +1,98 @@
+from collections import deque
+from typing import Dict, Hashable, List, Sequence
+
+import numpy as np
+
+from server.config.logging import logging
+from server.settings import settings
+
+
+def reciprocal_rank_fusion(
+    ranked_lists: Sequence[Sequence[Hashable]],
+    k: int = settings.hybrid_rrf_k,
+) -> Dict[Hashable, float]:
+    """
+    Score each key by the sum of 1 / (k + rank) over the lists it appears in.
+
+    Only ranks are used, so BM25 scores and cosine distances need no
+    normalisation against each other. Returns keys from best to worst.
+    """
+    scores: Dict[Hashable, float] = {}
+    for ranked_keys in ranked_lists:
+        for rank, key in enumerate(ranked_keys, start=1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+    return dict(sorted(scores.items(), key=lambda item: item[1], reverse=True))
+
+
+class RetrievalMetrics:
+    """Per-process latency and contribution counters of chunk retrieval."""
+
+    def __init__(self, window: int = 1000):
+        self.queries = {"vector": 0, "hybrid": 0}
+        self.lexical_hits = 0
+        self.lexical_only_hits = 0
+        self.returned_hits = 0
+        self._latencies = {
+            stage: deque(maxlen=window) for stage in ("vector", "lexical", "rerank", "total")
+        }
+
+    def record(
+        self,
+        hybrid: bool,
+        latencies: Dict[str, float],
+        returned: int = 0,
+        lexical: int = 0,
+        lexical_only: int = 0,
+    ):
+        self.queries["hybrid" if hybrid else "vector"] += 1
+        for stage, seconds in latencies.items():
+            self._latencies[stage].append(seconds * 1000)
+        self.returned_hits += returned
+        self.lexical_hits += lexical
+        self.lexical_only_hits += lexical_only
+
+        if sum(self.queries.values()) % 1000 == 0:
+            logging.info(f"Retrieval {self.stats()}")
+
+    def stats(self) -> dict:
+        latency_ms = {
+            stage: {
+                "p50": float(np.percentile(values, 50)),
+                "p95": float(np.percentile(values, 95)),
+            }
+            for stage, values in self._latencies.items()
+            if values
+        }
+        return {
+            "queries": dict(self.queries),
+            "latency_ms": latency_ms,
+            # Share of returned hybrid chunks that vector search alone missed.
+            "lexical_only_rate": (
+                self.lexical_only_hits / self.returned_hits if self.returned_hits else 0.0
+            ),
+            "lexical_hits": self.lexical_hits,
+        }
+
+
+retrieval_metrics = RetrievalMetrics()
+
+
+def fuse_hits(
+    vector_hits: List[dict],
+    lexical_hits: List[dict],
+    key,
+    limit: int,
+) -> List[dict]:
+    """Merge vector and BM25 hits of the same chunks with RRF."""
+    hits_by_key = {}
+    for hit in lexical_hits + vector_hits:
+        # Vector hits win so their distance is kept.
+        hits_by_key[key(hit)] = hit
+
+    scores = reciprocal_rank_fusion(
+        [[key(hit) for hit in vector_hits], [key(hit) for hit in lexical_hits]],
+    )
+    return [
+        {**hits_by_key[hit_key], "rrf_score": score}
+        for hit_key, score in list(scores.items())[:limit]
+    ]
@@ -0,0 +1,128 @@
+import asyncio
+from typing import Callable, Optional
+
+from server.config.logging import logging
+from server.services.chunker import ChunkAssembler
+from server.services.embedding_service import model_encode_texts
+from server.services.extract_service import iter_pages
+from server.services.file_service import (
+    insert_to_milvus_by_file,
+    split_content_to_sentences,
+)
+from server.settings import settings
+from server.web.api.file.schema import FileSchema
+
+# Marks the end of a stage's output.
+_END = object()
+
+
+def _new_queue() -> asyncio.Queue:
+    return asyncio.Queue(maxsize=settings.ingestion_queue_size)
+
+
+async def _page_stage(file: FileSchema, output: asyncio.Queue):
+    async for page in iter_pages(file.path):
+        await output.put(page)
+    await output.put(_END)
+
+
+async def _chunk_stage(
+    pages: asyncio.Queue,
+    output: asyncio.Queue,
+    skip_chunk: Optional[Callable[[str], bool]],
+):
+    assembler = ChunkAssembler()
+
+    async def put_chunks(chunks):
+        for chunk in chunks:
+            if skip_chunk is None or not skip_chunk(chunk):
+                await output.put(chunk)
+
+    while (page := await pages.get()) is not _END:
+        sentences = [
+            sentence
+            for sentence in split_content_to_sentences(page.to_text())
+            if sentence
+        ]
+        await put_chunks(assembler.feed(sentences))
+
+    await put_chunks(assembler.flush())
+    await output.put(_END)
+
+
+async def _embed_stage(chunks: asyncio.Queue, output: asyncio.Queue):
+    # Whole insert batches go to the embedding engine, which sorts them by
+    # token length into forward passes of up to embedding_max_batch_size
+    # texts and embedding_batch_tokens padded tokens.
+    batch = []
+
+    async def encode_batch():
+        vectors = await model_encode_texts(batch)
+        await output.put((list(batch), vectors))
+        batch.clear()
+
+    while (chunk := await chunks.get()) is not _END:
+        batch.append(chunk)
+        if len(batch) >= settings.milvus_insert_batch_size:
+            await encode_batch()
+
+    if batch:
+        await encode_batch()
+    await output.put(_END)
+
+
+async def _insert_stage(file: FileSchema, embedded: asyncio.Queue) -> int:
+    inserted_count = 0
+    chunks, vectors = [], []
+
+    async def insert_batch():
+        nonlocal inserted_count
+        await insert_to_milvus_by_file(file, chunks, vectors)
+        inserted_count += len(chunks)
+        chunks.clear()
+        vectors.clear()
+
+    while (item := await embedded.get()) is not _END:
+        batch_chunks, batch_vectors = item
+        chunks.extend(batch_chunks)
+        vectors.extend(batch_vectors)
+        if len(chunks) >= settings.milvus_insert_batch_size:
+            await insert_batch()
+
+    if chunks:
+        await insert_batch()
+    return inserted_count
+
+
+async def run_ingestion_pipeline(
+    file: FileSchema,
+    skip_chunk: Optional[Callable[[str], bool]] = None,
+) -> int:
+    """
+    Stream a file through extraction, chunking, embedding and Milvus inserts.
+
+    Stages run concurrently and hand work over through bounded queues, so
+    only a few pages, chunks and vector batches are held in memory at any
+    time regardless of the document size. Chunks for which `skip_chunk`
+    returns True are neither embedded nor inserted. Returns the number of
+    inserted chunks.
+    """
+    pages, chunks, embedded = _new_queue(), _new_queue(), _new_queue()
+    tasks = [
+        asyncio.create_task(_page_stage(file, pages)),
+        asyncio.create_task(_chunk_stage(pages, chunks, skip_chunk)),
+        asyncio.create_task(_embed_stage(chunks, embedded)),
+        asyncio.create_task(_insert_stage(file, embedded)),
+    ]
+
+    try:
+        results = await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+    inserted_count = results[-1]
+    logging.info(f"Ingested {inserted_count} chunks from file {file.id}")
+    return inserted_count
@@ -0,0 +1,173 @@
+import asyncio
+import os
+import signal
+import socket
+from uuid import uuid4
+
+from bson import ObjectId
+
+from server.config.logging import logging
+from server.config.milvusdb import flush_milvus_writes, milvus_manager
+from server.config.mongodb import close_mongodb, connect_mongodb, get_db
+from server.services.extract_service import shutdown_process_pool
+from server.services.file_service import (
+    delete_docs_by_file_id,
+    insert_docs,
+    reindex_docs,
+)
+from server.services.job_queue import (
+    complete_job,
+    ensure_job_indexes,
+    fail_abandoned_job,
+    fail_job,
+    lease_job,
+    mark_indexing_started,
+    release_job,
+    renew_lease,
+)
+from server.settings import settings
+from server.web.api.file.schema import FileSchema, IngestionJob, JobKind
+
+
+class IngestionWorker:
+    """
+    Consumes the ingestion job queue.
+
+    Each worker process runs `concurrency` job slots; throughput is scaled by
+    starting more `python -m server.worker` processes.
+    """
+
+    def __init__(self, concurrency: int = settings.ingestion_worker_concurrency):
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+        self.concurrency = concurrency
+        self.stopping = asyncio.Event()
+
+    async def run(self):
+        await ensure_job_indexes()
+        logging.info(
+            f"Ingestion worker {self.worker_id} started "
+            f"with {self.concurrency} slot(s)",
+        )
+        await asyncio.gather(*[self._run_slot() for _ in range(self.concurrency)])
+        logging.info(f"Ingestion worker {self.worker_id} stopped")
+
+    def stop(self):
+        self.stopping.set()
+
+    async def _run_slot(self):
+        while not self.stopping.is_set():
+            try:
+                while (abandoned_job := await fail_abandoned_job()) is not None:
+                    await self._drop_chunks(abandoned_job)
+                job = await lease_job(self.worker_id)
+            except Exception as e:
+                logging.error(f"Error: {e}")
+                job = None
+
+            if job is None:
+                try:
+                    await asyncio.wait_for(
+                        self.stopping.wait(),
+                        timeout=settings.ingestion_job_poll_interval,
+                    )
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self._process(job)
+
+    async def _keep_lease(self, job: IngestionJob):
+        """Renew the job's lease; returns once it has been lost."""
+        while True:
+            await asyncio.sleep(settings.ingestion_job_lease_seconds / 3)
+            try:
+                if not await renew_lease(job, self.worker_id):
+                    return
+            except Exception as e:
+                # Retried; an expired lease is only lost once taken over.
+                logging.error(f"Error: {e}")
+
+    async def _process(self, job: IngestionJob):
+        logging.info(f"Processing ingestion job {job.id} (file {job.file_id})")
+        heartbeat = asyncio.create_task(self._keep_lease(job))
+        ingestion = asyncio.create_task(self._ingest(job))
+        stopping = asyncio.create_task(self.stopping.wait())
+        try:
+            await asyncio.wait(
+                [ingestion, stopping, heartbeat],
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if not ingestion.done():
+                ingestion.cancel()
+                await asyncio.gather(ingestion, return_exceptions=True)
+                if heartbeat.done():
+                    # Another worker has the job now and redoes it from scratch.
+                    logging.warning(f"Lost the lease of ingestion job {job.id}, dropping it")
+                else:
+                    await release_job(job, self.worker_id)
+                return
+
+            error = ingestion.exception()
+            if error is None:
+                if not await complete_job(job, self.worker_id):
+                    logging.warning(
+                        f"Ingestion job {job.id} finished after its lease was lost",
+                    )
+            else:
+                logging.error(f"Error: {error}")
+                if await fail_job(job, self.worker_id, str(error)):
+                    await self._drop_chunks(job)
+        finally:
+            heartbeat.cancel()
+            stopping.cancel()
+
+    async def _drop_chunks(self, job: IngestionJob):
+        """Chunks are inserted batch by batch; a file that failed for good
+        must not stay searchable with part of them."""
+        loop = asyncio.get_running_loop()
+        if not await loop.run_in_executor(None, delete_docs_by_file_id, job.file_id):
+            logging.error(f"Error: could not delete the chunks of failed file {job.file_id}")
+
+    async def _ingest(self, job: IngestionJob):
+        files_collection = get_db().get_collection("files")
+        existing_file = await files_collection.find_one(
+            {"_id": ObjectId(job.file_id)},
+        )
+        if not existing_file:
+            raise FileNotFoundError(
+                f"File with ID {job.file_id} not found in the database.",
+            )
+
+        file = FileSchema(**existing_file)
+        if job.kind == JobKind.reindex:
+            await reindex_docs(file)
+            return
+
+        if job.indexing_started_at is not None:
+            # Drop what an earlier attempt may have already indexed. Not
+            # derived from `attempts`, which a released job gives back.
+            if not delete_docs_by_file_id(file.id):
+                raise RuntimeError(f"Could not clear partial chunks of file {file.id}")
+        else:
+            await mark_indexing_started(job, self.worker_id)
+
+        await insert_docs(file)
+
+
+async def run_worker():
+    connect_mongodb()
+    worker = IngestionWorker()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, worker.stop)
+    milvus_flusher = asyncio.create_task(flush_milvus_writes())
+    try:
+        await worker.run()
+    finally:
+        milvus_flusher.cancel()
+        try:
+            milvus_manager.flush()
+        except Exception as e:
+            logging.error(f"Error: {e}")
+        shutdown_process_pool()
+        close_mongodb()
@@ -0,0 +1,287 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from uuid import uuid4
+
+from bson import ObjectId
+from pymongo import ASCENDING, ReturnDocument
+
+from server.config.logging import logging
+from server.config.mongodb import get_db
+from server.settings import settings
+from server.web.api.file.schema import (
+    FileSchema,
+    FileStatus,
+    IngestionJob,
+    JobKind,
+    JobStatus,
+)
+
+JOBS_COLLECTION = "ingestion_jobs"
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _lease_filter(job: IngestionJob, worker_id: str) -> dict:
+    """Matches the job only while `worker_id` still holds the lease it took."""
+    return {
+        "_id": ObjectId(job.id),
+        "status": JobStatus.running,
+        "worker_id": worker_id,
+        "lease_id": job.lease_id,
+    }
+
+
+async def ensure_job_indexes():
+    jobs_collection = get_db().get_collection(JOBS_COLLECTION)
+    await jobs_collection.create_index(
+        [("status", ASCENDING), ("available_at", ASCENDING)],
+    )
+    await jobs_collection.create_index(
+        [("status", ASCENDING), ("lease_expires_at", ASCENDING)],
+    )
+    await jobs_collection.create_index([("finished_at", ASCENDING)])
+
+
+async def enqueue_ingestion_job(
+    file: FileSchema,
+    kind: JobKind = JobKind.ingest,
+) -> IngestionJob:
+    jobs_collection = get_db().get_collection(JOBS_COLLECTION)
+
+    job = IngestionJob(file_id=file.id, owner=file.owner, kind=kind)
+    result = await jobs_collection.insert_one(
+        job.model_dump(by_alias=True, exclude=["id"]),
+    )
+    job.id = str(result.inserted_id)
+    logging.info(f"Enqueued {kind.value.lower()} job {job.id} for file {file.id}")
+    return job
+
+
+async def lease_job(worker_id: str) -> Optional[IngestionJob]:
+    """
+    Atomically take the oldest runnable job.
+
+    A job is runnable when it is queued and due, or when it is running but
+    the lease of the worker that took it has expired (the worker crashed or
+    was restarted mid-job) and it has attempts left; see `fail_abandoned_job`
+    for those that have none.
+    """
+    jobs_collection = get_db().get_collection(JOBS_COLLECTION)
+    now = _now()
+
+    leased_job = await jobs_collection.find_one_and_update(
+        {
+            "$or": [
+                {"status": JobStatus.queued, "available_at": {"$lte": now}},
+                {
+                    "status": JobStatus.running,
+                    "lease_expires_at": {"$lt": now},
+                    "attempts": {"$lt": settings.ingestion_job_max_attempts},
+                },
+            ],
+        },
+        {
+            "$set": {
+                "status": JobStatus.running,
+                "worker_id": worker_id,
+                "lease_id": uuid4().hex,
+                "lease_expires_at": now
+                + timedelta(seconds=settings.ingestion_job_lease_seconds),
+            },
+            "$inc": {"attempts": 1},
+        },
+        sort=[("created_at", ASCENDING)],
+        return_document=ReturnDocument.AFTER,
+    )
+    if leased_job is None:
+        return None
+    return IngestionJob(**leased_job)
+
+
+async def fail_abandoned_job() -> Optional[IngestionJob]:
+    """
+    Give up on a job whose worker died during its last attempt, and mark
+    its file as failed.
+
+    A file that crashes the worker process, e.g. by running out of memory,
+    never reaches `fail_job`; without this it would be retried forever,
+    taking down every worker in turn.
+    """
+    db = get_db()
+    now = _now()
+    abandoned_job = await db.get_collection(JOBS_COLLECTION).find_one_and_update(
+        {
+            "status": JobStatus.running,
+            "lease_expires_at": {"$lt": now},
+            "attempts": {"$gte": settings.ingestion_job_max_attempts},
+        },
+        {
+            "$set": {
+                "status": JobStatus.failed,
+                "lease_expires_at": None,
+                "error": "The worker stopped during the last attempt",
+                "finished_at": now,
+            },
+        },
+        return_document=ReturnDocument.AFTER,
+    )
+    if abandoned_job is None:
+        return None
+
+    job = IngestionJob(**abandoned_job)
+    await db.get_collection("files").update_one(
+        {"_id": ObjectId(job.file_id)},
+        {"$set": {"status": FileStatus.error}},
+    )
+    logging.error(
+        f"Ingestion job {job.id} failed permanently: its worker stopped "
+        f"during all {job.attempts} attempts",
+    )
+    return job
+
+
+async def renew_lease(job: IngestionJob, worker_id: str) -> bool:
+    jobs_collection = get_db().get_collection(JOBS_COLLECTION)
+    result = await jobs_collection.update_one(
+        _lease_filter(job, worker_id),
+        {
+            "$set": {
+                "lease_expires_at": _now()
+                + timedelta(seconds=settings.ingestion_job_lease_seconds),
+            },
+        },
+    )
+    return result.matched_count > 0
+
+
+async def mark_indexing_started(job: IngestionJob, worker_id: str):
+    jobs_collection = get_db().get_collection(JOBS_COLLECTION)
+    job.indexing_started_at = _now()
+    await jobs_collection.update_one(
+        _lease_filter(job, worker_id),
+        {"$set": {"indexing_started_at": job.indexing_started_at}},
+    )
+
+
+async def complete_job(job: IngestionJob, worker_id: str) -> bool:
+    """Mark the job done; False if the worker no longer held its lease."""
+    jobs_collection = get_db().get_collection(JOBS_COLLECTION)
+    result = await jobs_collection.update_one(
+        _lease_filter(job, worker_id),
+        {
+            "$set": {
+                "status": JobStatus.done,
+                "lease_expires_at": None,
+                "error": None,
+                "finished_at": _now(),
+            },
+        },
+    )
+    return result.matched_count > 0
+
+
+async def fail_job(job: IngestionJob, worker_id: str, error: str) -> bool:
+    """
+    Requeue the job with a delay, or give up once attempts are exhausted.
+
+    Returns whether it was given up.
+    """
+    db = get_db()
+    jobs_collection = db.get_collection(JOBS_COLLECTION)
+
+    if job.attempts < settings.ingestion_job_max_attempts:
+        await jobs_collection.update_one(
+            _lease_filter(job, worker_id),
+            {
+                "$set": {
+                    "status": JobStatus.queued,
+                    "lease_expires_at": None,
+                    "error": error,
+                    "available_at": _now()
+                    + timedelta(seconds=settings.ingestion_job_retry_delay_seconds),
+                },
+            },
+        )
+        logging.warning(
+            f"Ingestion job {job.id} failed (attempt {job.attempts}), retrying",
+        )
+        return False
+
+    result = await jobs_collection.update_one(
+        _lease_filter(job, worker_id),
+        {
+            "$set": {
+                "status": JobStatus.failed,
+                "lease_expires_at": None,
+                "error": error,
+                "finished_at": _now(),
+            },
+        },
+    )
+    if result.matched_count == 0:
+        # Taken over by another worker, which now owns the outcome.
+        return False
+    await db.get_collection("files").update_one(
+        {"_id": ObjectId(job.file_id)},
+        {"$set": {"status": FileStatus.error}},
+    )
+    logging.error(f"Ingestion job {job.id} failed permanently: {error}")
+    return True
+
+
+async def release_job(job: IngestionJob, worker_id: str):
+    """Hand a job back without consuming an attempt, e.g. on worker shutdown."""
+    jobs_collection = get_db().get_collection(JOBS_COLLECTION)
+    await jobs_collection.update_one(
+        _lease_filter(job, worker_id),
+        {
+            "$set": {"status": JobStatus.queued, "lease_expires_at": None},
+            "$inc": {"attempts": -1},
+        },
+    )
+
+
+async def notify_finished_jobs(since: datetime) -> datetime:
+    """
+    Push the final file status of jobs finished after `since`.
+
+    Every API process runs this for its own socket connections, so nothing is
+    marked on the job itself. Returns the new watermark.
+    """
+    from server.config.socketio import socketio_app
+
+    jobs_collection = get_db().get_collection(JOBS_COLLECTION)
+    finished_jobs = await jobs_collection.find(
+        {
+            "finished_at": {"$gt": since},
+            "status": {"$in": [JobStatus.done, JobStatus.failed]},
+        },
+    ).sort("finished_at", ASCENDING).to_list(length=None)
+
+    for finished_job in finished_jobs:
+        job = IngestionJob(**finished_job)
+        await socketio_app.send_file_status(
+            receiver_id=job.owner,
+            file_id=job.file_id,
+            status=(
+                FileStatus.success
+                if job.status == JobStatus.done
+                else FileStatus.error
+            ),
+        )
+        since = job.finished_at
+
+    return since
+
+
+async def watch_finished_jobs():
+    since = _now()
+    while True:
+        try:
+            since = await notify_finished_jobs(since)
+        except Exception as e:
+            logging.error(f"Error: {e}")
+        await asyncio.sleep(settings.ingestion_job_notify_interval)
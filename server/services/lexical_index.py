@@ -0,0 +1,154 @@
+import re
+import sqlite3
+import threading
+import unicodedata
+from typing import Dict, Iterable, List
+
+from server.config.logging import logging
+from server.services.chunker import chunk_hash
+from server.services.sqlite_connection import ProcessConnection
+from server.settings import settings
+
+# `terms` holds the pre-tokenized chunk, so FTS5 only has to split on spaces;
+# `_` joins syllable pairs and code parts into single terms.
+_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS chunks USING fts5(
+    terms,
+    file_id,
+    text UNINDEXED,
+    file_name UNINDEXED,
+    chunk_hash UNINDEXED,
+    tokenize = "unicode61 remove_diacritics 0 tokenchars '_'"
+);
+"""
+
+# Words, and codes such as "123/2020/NĐ-CP" or "v2.3.1" kept together.
+_TOKEN_RE = re.compile(r"\w+(?:[-./]\w+)*")
+_WORD_RE = re.compile(r"[^\W_]+")
+
+# Bound the cost of a query made of a long paragraph.
+_MAX_QUERY_TERMS = 64
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Vietnamese-aware terms of a text.
+
+    Vietnamese words are one or more space separated syllables, so besides
+    each syllable every pair of adjacent syllables is a term ("hợp_đồng"),
+    which ranks the compound above its syllables found apart. Diacritics are
+    kept ("mã" and "ma" differ). Codes and numbers with separators are kept
+    whole as well as split into their parts.
+    """
+    text = unicodedata.normalize("NFC", text).lower()
+    terms = []
+    previous_word = None
+    for match in _TOKEN_RE.finditer(text):
+        token = match.group()
+        words = _WORD_RE.findall(token)
+        if len(words) > 1:
+            terms.append("_".join(words))
+        for word in words:
+            terms.append(word)
+            if previous_word is not None:
+                terms.append(f"{previous_word}_{word}")
+            previous_word = word
+    return terms
+
+
+def _quote(term: str) -> str:
+    return f'"{term}"'
+
+
+class LexicalIndex:
+    """
+    BM25 index of chunk texts on SQLite FTS5, next to the vectors in Milvus.
+
+    Every chunk row carries its file id as an indexed term, so a search is
+    restricted to a bot's files inside the index itself, and a file's rows
+    are replaced or dropped on their own.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = ProcessConnection(path, _SCHEMA)
+
+    def _write(self, statement: str, rows: Iterable[tuple]):
+        with self._lock:
+            connection = self._connection.get()
+            try:
+                connection.execute("BEGIN IMMEDIATE")
+                connection.executemany(statement, rows)
+                connection.execute("COMMIT")
+            except sqlite3.Error:
+                if connection.in_transaction:
+                    connection.execute("ROLLBACK")
+                raise
+
+    def add_chunks(self, file_id: str, file_name: str, chunks: List[str]):
+        self._write(
+            "INSERT INTO chunks (terms, file_id, text, file_name, chunk_hash) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [
+                (" ".join(tokenize(chunk)), file_id, chunk, file_name, chunk_hash(chunk))
+                for chunk in chunks
+            ],
+        )
+
+    def delete_chunks(self, file_id: str, chunk_counts: Dict[str, int]):
+        """Delete `count` rows of each chunk hash of a file."""
+        self._write(
+            "DELETE FROM chunks WHERE rowid IN ("
+            "SELECT rowid FROM chunks WHERE chunks MATCH ? AND chunk_hash = ? LIMIT ?"
+            ")",
+            [
+                (f"file_id : {_quote(file_id)}", hash_, count)
+                for hash_, count in chunk_counts.items()
+            ],
+        )
+
+    def delete_file(self, file_id: str):
+        self._write(
+            "DELETE FROM chunks WHERE chunks MATCH ?",
+            [(f"file_id : {_quote(file_id)}",)],
+        )
+
+    def search(self, query: str, file_ids: List[str], limit: int) -> List[dict]:
+        terms = list(dict.fromkeys(tokenize(query)))[:_MAX_QUERY_TERMS]
+        if not terms or not file_ids:
+            return []
+
+        match = (
+            f"file_id : ({' OR '.join(_quote(file_id) for file_id in file_ids)}) "
+            f"AND terms : ({' OR '.join(_quote(term) for term in terms)})"
+        )
+        with self._lock:
+            rows = (
+                self._connection.get()
+                .execute(
+                    # Only the terms column is scored, not the file id filter.
+                    "SELECT text, file_id, file_name, bm25(chunks, 1.0, 0.0) AS score "
+                    "FROM chunks WHERE chunks MATCH ? ORDER BY score LIMIT ?",
+                    [match, limit],
+                )
+                .fetchall()
+            )
+        return [
+            {"text": text, "file_id": file_id, "file_name": file_name, "score": -score}
+            for text, file_id, file_name, score in rows
+        ]
+
+
+lexical_index = LexicalIndex(settings.lexical_index_path)
+
+
+def safe_index_call(method, *args):
+    """The lexical index is an optional add-on to the vectors; never fail an
+    ingestion or delete because of it."""
+    if not settings.lexical_index_enabled:
+        return
+    try:
+        method(*args)
+    except Exception as e:
+        logging.error(f"Error: lexical index {method.__name__} failed: {e}")
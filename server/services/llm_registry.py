@@ -0,0 +1,121 @@
+from typing import Dict, Optional
+
+import httpx
+from langchain.chains.combine_documents import create_stuff_documents_chain
+from langchain.prompts import ChatPromptTemplate
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.runnables import Runnable
+from langchain_openai import ChatOpenAI
+
+from server.config.logging import logging
+from server.settings import settings
+
+# Model served by the local stub instead of OpenAI; only used while
+# settings.llm_stub_enabled is set.
+STUB_MODEL = "stub"
+
+ANSWER_PROMPT = ChatPromptTemplate.from_template(
+    """
+            Bạn là một trợ lý ảo người Việt Nam, chuyên hỗ trợ trả lời các câu hỏi dựa trên tài liệu {context}
+                - Nếu câu hỏi là một lời chào (ví dụ: "xin chào", "hello", "chào bạn"), hãy trả lời "Em là trợ lý AI, anh/chị cần em giúp điều gì ạ".
+                - Nếu câu hỏi liên quan đến tài liệu hãy trả lời theo định dạng <<Nội dung câu trả lời của em, phải có câu dẫn ví dụ em xin trả lời câu hỏi của anh/chị>>
+                - Nếu câu hỏi không liên quan đến tài liệu hãy trả lời  "Nội dung này em k có thông tin, mời anh/chị đặt câu hỏi khác --suggest_question: <<Câu hỏi gợi ý ngắn cho người dùng hỏi bạn liên quan đến tài liệu>>".
+            Câu hỏi hiện tại: {question}
+            * Quan trọng nội dung trong cặp ngoặc <<>> là nội dung cần thay đổi, Phải luôn xưng là em và gọi người dùng là anh/chị  
+            """,
+)
+
+# Canned answers of the stub, in the same format the prompt asks of the model.
+STUB_RESPONSES = [
+    "<<Em xin trả lời câu hỏi của anh/chị: đây là câu trả lời mẫu từ mô hình "
+    "thử nghiệm, dùng để kiểm tra tải mà không gọi OpenAI.>>",
+    "Nội dung này em k có thông tin, mời anh/chị đặt câu hỏi khác "
+    "--suggest_question: <<Tài liệu này nói về nội dung gì?>>",
+]
+
+_http_client: Optional[httpx.Client] = None
+_http_async_client: Optional[httpx.AsyncClient] = None
+_chains: Dict[str, Runnable] = {}
+
+
+def _http_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.llm_max_connections,
+        max_keepalive_connections=settings.llm_max_keepalive_connections,
+        keepalive_expiry=settings.llm_keepalive_expiry,
+    )
+
+
+def _create_llm(model_name: str):
+    if model_name == STUB_MODEL:
+        return FakeListChatModel(
+            responses=STUB_RESPONSES,
+            sleep=settings.llm_stub_token_delay,
+        )
+
+    global _http_client, _http_async_client
+    if _http_async_client is None:
+        # Shared by every model, so connections to the API stay open between
+        # messages instead of a new TLS handshake per answer.
+        _http_client = httpx.Client(limits=_http_limits(), timeout=settings.llm_timeout)
+        _http_async_client = httpx.AsyncClient(
+            limits=_http_limits(),
+            timeout=settings.llm_timeout,
+        )
+    return ChatOpenAI(
+        model_name=model_name,
+        temperature=0.1,
+        max_tokens=512,
+        openai_api_key=settings.openai_api_key,
+        http_client=_http_client,
+        http_async_client=_http_async_client,
+    )
+
+
+def _build_chain(model_name: str) -> Runnable:
+    return create_stuff_documents_chain(_create_llm(model_name), ANSWER_PROMPT)
+
+
+def resolve_response_model(response_model: Optional[str]) -> str:
+    """The model that answers for a bot's `response_model`."""
+    if settings.llm_stub_enabled:
+        return STUB_MODEL
+    if response_model in settings.llm_models:
+        return response_model
+    return settings.llm_default_model
+
+
+def is_allowed_response_model(response_model: str) -> bool:
+    """Whether a bot may be set to `response_model`; the stub only while it
+    is enabled, so production bots cannot be switched to canned answers."""
+    return response_model != STUB_MODEL or settings.llm_stub_enabled
+
+
+def build_answer_chains():
+    """Build the answer chain of every configured model, once per process."""
+    model_names = {settings.llm_default_model, *settings.llm_models}
+    if settings.llm_stub_enabled:
+        model_names = {STUB_MODEL}
+    for model_name in model_names:
+        if model_name not in _chains:
+            _chains[model_name] = _build_chain(model_name)
+    logging.info(f"Answer chains ready for {sorted(_chains)}")
+
+
+def get_answer_chain(response_model: Optional[str]) -> Runnable:
+    model_name = resolve_response_model(response_model)
+    if model_name != response_model:
+        logging.debug(f"Response model {response_model} answered by {model_name}")
+    if model_name not in _chains:
+        # Used outside the API process, where startup did not build them.
+        _chains[model_name] = _build_chain(model_name)
+    return _chains[model_name]
+
+
+async def close_llm_clients():
+    global _http_client, _http_async_client
+    if _http_async_client is not None:
+        await _http_async_client.aclose()
+        _http_client.close()
+    _http_client, _http_async_client = None, None
+    _chains.clear()
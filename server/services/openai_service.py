@@ -1,39 +1,129 @@
 import re
-from typing import List
+import time
+from typing import Awaitable, Callable, List, Optional
 from nltk.translate.bleu_score import sentence_bleu, SmoothingFunction
-from langchain.chains.combine_documents import create_stuff_documents_chain
 from rouge_score import rouge_scorer
-from langchain.prompts import ChatPromptTemplate
 from langchain.schema import Document
-from langchain_openai import ChatOpenAI
-from langchain.chains.question_answering import load_qa_chain
 from server.config.logging import logging
 from server.config.milvusdb import get_milvusdb
+from server.services.answer_cache import (
+    answer_cache_metrics,
+    find_cached_answer,
+    store_answer,
+)
+from server.services.embedding_service import model_encode_text
+from server.services.llm_registry import get_answer_chain
 from server.settings import settings
 
-# bge_rf = BGERerankFunction(
-#             model_name="BAAI/bge-reranker-v2-m3",
-# )
+SUGGEST_QUESTION_MARKER = "--suggest_question:"
+
+
+class AnswerStreamFilter:
+    """
+    Turns streamed model tokens into the text of the answer as it will be
+    sent in the final message: the <<>> markers are dropped and nothing from
+    the suggested question onwards is passed on. Text that could be the
+    start of a marker split across tokens is held back until it is known.
+    """
+
+    _markers = ("<<", ">>", SUGGEST_QUESTION_MARKER)
+
+    def __init__(self):
+        self._pending = ""
+        self._started = False
+        self._done = False
+
+    def _held_back(self, text: str) -> int:
+        # Length of the longest suffix of `text` that is a marker prefix.
+        for length in range(min(len(text), len(SUGGEST_QUESTION_MARKER) - 1), 0, -1):
+            suffix = text[-length:]
+            if any(marker.startswith(suffix) for marker in self._markers):
+                return length
+        return 0
+
+    def _emit(self, text: str) -> str:
+        if not self._started:
+            text = text.lstrip()
+            self._started = bool(text)
+        return text
+
+    def feed(self, token: str) -> str:
+        if self._done:
+            return ""
+        text = self._pending + token
+        if SUGGEST_QUESTION_MARKER in text:
+            self._done = True
+            text = text.split(SUGGEST_QUESTION_MARKER, 1)[0]
+            self._pending = ""
+            return self._emit(re.sub(r"<<|>>", "", text).rstrip())
+
+        keep = self._held_back(text)
+        # Trailing whitespace too: the answer is stripped before the marker.
+        keep = len(text) - len(text[: len(text) - keep].rstrip())
+        self._pending = text[len(text) - keep :] if keep else ""
+        text = text[: len(text) - keep]
+        # A complete "<<" or ">>" can only be left once the held back part is cut.
+        return self._emit(re.sub(r"<<|>>", "", text))
+
+    def flush(self) -> str:
+        if self._done:
+            return ""
+        self._done = True
+        return self._emit(re.sub(r"<<|>>", "", self._pending).rstrip())
+
 
-    
 async def fetch_answer_by_file_ids_and_chat_id(
     query: str,
     file_ids: List[str],
     chat_id: str,
-    response_model
+    response_model,
+    owners: Optional[List[str]] = None,
+    hybrid: bool = False,
+    bot_id: Optional[str] = None,
+    knowledge_version: Optional[str] = None,
+    use_cache: bool = True,
+    on_token: Optional[Callable[[str], Awaitable[None]]] = None,
+    on_stream_error: Optional[Callable[[], Awaitable[None]]] = None,
 ) -> dict:
+    """
+    With `bot_id` and `knowledge_version` (see answer_cache.knowledge_version)
+    a semantically close earlier question to the same bot is answered from
+    the answer cache. `use_cache=False` always asks the model, and caches
+    the fresh answer.
+
+    With `on_token`, the answer is streamed from the model and each new piece
+    of its text is awaited with `on_token` as it arrives; the returned message
+    is the same either way. Cached answers are returned without streaming.
+    If the answer fails after some of it was streamed, `on_stream_error` is
+    awaited before the fallback message is returned, so the partial text
+    can be discarded.
+    """
     from .file_service import get_similar_docs_by_file_ids
 
+    streamed = False
     try:
 
-        milvusdb = get_milvusdb()
-        if not milvusdb:
+        if not get_milvusdb():
             raise Exception("Not connect milvus DB")
 
+        cache_enabled = (
+            settings.answer_cache_enabled and bot_id is not None and knowledge_version
+        )
+        if cache_enabled and not use_cache:
+            answer_cache_metrics.bypassed += 1
+        if cache_enabled and use_cache:
+            # Reused by the retrieval below through the query vector cache.
+            query_vector = await model_encode_text(query)
+            cached_answer = await find_cached_answer(bot_id, knowledge_version, query_vector)
+            if cached_answer is not None:
+                return cached_answer
+
         similar_docs = await get_similar_docs_by_file_ids(
             query=query,
             file_ids=file_ids,
             top_k=5,
+            owners=owners,
+            hybrid=hybrid,
         )
 
         
@@ -48,31 +138,33 @@ async def fetch_answer_by_file_ids_and_chat_id(
 
         
 
-        llm = ChatOpenAI(
-            model_name="gpt-4",
-            temperature=0.1,
-            max_tokens=512,
-            openai_api_key=settings.openai_api_key,
-        )
-
-        chain = load_qa_chain(llm, "stuff")
-        prompt = ChatPromptTemplate.from_template(
-            """
-            Bạn là một trợ lý ảo người Việt Nam, chuyên hỗ trợ trả lời các câu hỏi dựa trên tài liệu {context}
-                - Nếu câu hỏi là một lời chào (ví dụ: "xin chào", "hello", "chào bạn"), hãy trả lời "Em là trợ lý AI, anh/chị cần em giúp điều gì ạ".
-                - Nếu câu hỏi liên quan đến tài liệu hãy trả lời theo định dạng <<Nội dung câu trả lời của em, phải có câu dẫn ví dụ em xin trả lời câu hỏi của anh/chị>>
-                - Nếu câu hỏi không liên quan đến tài liệu hãy trả lời  "Nội dung này em k có thông tin, mời anh/chị đặt câu hỏi khác --suggest_question: <<Câu hỏi gợi ý ngắn cho người dùng hỏi bạn liên quan đến tài liệu>>".
-            Câu hỏi hiện tại: {question}
-            * Quan trọng nội dung trong cặp ngoặc <<>> là nội dung cần thay đổi, Phải luôn xưng là em và gọi người dùng là anh/chị  
-            """,
-        )
-
-        chain = create_stuff_documents_chain(llm, prompt)
-        result = chain.invoke({"context": similar_docs, "question": query})
+        chain = get_answer_chain(response_model)
+        chain_input = {"context": similar_docs, "question": query}
+        if on_token is None:
+            result = await chain.ainvoke(chain_input)
+        else:
+            stream_filter = AnswerStreamFilter()
+            tokens = []
+            started_at = time.perf_counter()
+            async for token in chain.astream(chain_input):
+                if not tokens:
+                    logging.info(
+                        f"First answer token after {time.perf_counter() - started_at:.2f}s",
+                    )
+                tokens.append(token)
+                text = stream_filter.feed(token)
+                if text:
+                    streamed = True
+                    await on_token(text)
+            text = stream_filter.flush()
+            if text:
+                streamed = True
+                await on_token(text)
+            result = "".join(tokens)
 
         cleaned_text = re.sub(r"<<|>>", "", result)
-        if "--suggest_question:" in cleaned_text:
-            answer, suggest_question = cleaned_text.split("--suggest_question:")
+        if SUGGEST_QUESTION_MARKER in cleaned_text:
+            answer, suggest_question = cleaned_text.split(SUGGEST_QUESTION_MARKER, 1)
             message = {
                 "answer": answer.strip(),
                 "suggest_question": suggest_question.strip(),
@@ -81,8 +173,21 @@ async def fetch_answer_by_file_ids_and_chat_id(
         else:
             message = {"answer": cleaned_text.strip()}
 
+        if cache_enabled:
+            await store_answer(
+                bot_id,
+                knowledge_version,
+                query,
+                await model_encode_text(query),
+                message,
+            )
         return message
 
     except Exception as e:
         logging.error(f"Error: {e}")
+        if streamed and on_stream_error is not None:
+            try:
+                await on_stream_error()
+            except Exception as error:
+                logging.error(f"Error: {error}")
         return {"answer": "Nội dung này tôi chưa có thông tin, mời bạn hỏi câu khác"}
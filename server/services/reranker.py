@@ -0,0 +1,214 @@
+import asyncio
+import hashlib
+import struct
+import threading
+import time
+import unicodedata
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Optional
+
+import numpy as np
+
+from server.config.logging import logging
+from server.services.chunker import chunk_hash
+from server.services.disk_cache import DiskCache
+from server.settings import settings
+
+rerank_cache = DiskCache(
+    name="Rerank",
+    path=settings.rerank_cache_path,
+    max_bytes=settings.rerank_cache_max_bytes,
+)
+
+# One scoring pass at a time; concurrent passes would only fight for the
+# same CPU cores and all miss the budget.
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rerank")
+
+_model = None
+_model_lock = threading.Lock()
+
+# Scoring passes submitted and not finished; guarded by _passes_lock.
+_pending_passes = 0
+_passes_lock = threading.Lock()
+
+
+def _submit_pass(function, *args) -> Optional[Future]:
+    """Submit a scoring pass unless `rerank_max_pending_passes` are already
+    queued or running, so passes past their budget cannot pile up."""
+    global _pending_passes
+    with _passes_lock:
+        if _pending_passes >= settings.rerank_max_pending_passes:
+            return None
+        _pending_passes += 1
+
+    def finished(_future):
+        global _pending_passes
+        with _passes_lock:
+            _pending_passes -= 1
+
+    future = _executor.submit(function, *args)
+    future.add_done_callback(finished)
+    return future
+
+
+def get_reranker():
+    """Load the cross-encoder on first use."""
+    global _model
+    with _model_lock:
+        if _model is None:
+            from sentence_transformers import CrossEncoder
+
+            started_at = time.perf_counter()
+            _model = CrossEncoder(
+                settings.rerank_model,
+                device="cpu",
+                max_length=settings.rerank_max_length,
+            )
+            logging.info(
+                f"Loaded reranker {settings.rerank_model} "
+                f"in {time.perf_counter() - started_at:.1f}s",
+            )
+    return _model
+
+
+def warm_up_reranker():
+    """Load the model on the rerank thread without waiting for it, so the
+    first questions fall back to retrieval order instead of blocking."""
+    if settings.rerank_enabled:
+        _submit_pass(get_reranker)
+
+
+def rerank_cache_key(query: str, text: str) -> str:
+    normalized_query = " ".join(unicodedata.normalize("NFC", query).lower().split())
+    return hashlib.sha256(
+        f"{settings.rerank_model}\0{normalized_query}\0{chunk_hash(text)}".encode("utf-8"),
+    ).hexdigest()
+
+
+def _score(query: str, texts: List[str], keys: List[str]) -> List[float]:
+    scores = get_reranker().predict(
+        [(query, text) for text in texts],
+        batch_size=settings.rerank_batch_size,
+        convert_to_numpy=True,
+        show_progress_bar=False,
+    )
+    scores = [float(score) for score in np.asarray(scores).reshape(-1)]
+    # Written here rather than by the caller, so a pass that ran over the
+    # budget still serves the next identical question.
+    rerank_cache.set_many(
+        {key: struct.pack("<f", score) for key, score in zip(keys, scores)},
+    )
+    return scores
+
+
+class RerankMetrics:
+    """Per-process counters of the rerank stage."""
+
+    def __init__(self, window: int = 1000):
+        self.reranked = 0
+        self.fallbacks = 0
+        self.skipped = 0
+        self.errors = 0
+        self._latencies = deque(maxlen=window)
+
+    def record(self, seconds: float, outcome: str):
+        setattr(self, outcome, getattr(self, outcome) + 1)
+        self._latencies.append(seconds * 1000)
+
+    def stats(self) -> dict:
+        latencies = np.asarray(self._latencies) if self._latencies else None
+        return {
+            "reranked": self.reranked,
+            "fallbacks": self.fallbacks,
+            "skipped": self.skipped,
+            "errors": self.errors,
+            "latency_ms": (
+                {
+                    "p50": float(np.percentile(latencies, 50)),
+                    "p95": float(np.percentile(latencies, 95)),
+                }
+                if latencies is not None
+                else {}
+            ),
+            "cache": rerank_cache.stats(),
+        }
+
+
+rerank_metrics = RerankMetrics()
+
+
+async def rerank_hits(
+    query: str,
+    hits: List[dict],
+    top_k: int,
+    budget_ms: Optional[float] = None,
+) -> List[dict]:
+    """
+    Order retrieved hits by cross-encoder score and keep the best `top_k`.
+
+    Cached (query, chunk) scores are reused and the rest are scored in one
+    batched pass. If that pass does not finish within `budget_ms`, fails,
+    or cannot be queued because the rerank thread is busy, the hits are
+    returned in their retrieval order.
+    """
+    if len(hits) <= 1:
+        return hits[:top_k]
+
+    budget_ms = settings.rerank_budget_ms if budget_ms is None else budget_ms
+    started_at = time.perf_counter()
+    loop = asyncio.get_event_loop()
+
+    keys = [rerank_cache_key(query, hit["text"]) for hit in hits]
+    cached_scores = {
+        key: struct.unpack("<f", value)[0]
+        for key, value in (
+            await loop.run_in_executor(None, rerank_cache.get_many, keys)
+        ).items()
+    }
+
+    missing = {}
+    for key, hit in zip(keys, hits):
+        if key not in cached_scores:
+            missing.setdefault(key, hit["text"])
+
+    outcome = "reranked"
+    if missing:
+        remaining = budget_ms / 1000 - (time.perf_counter() - started_at)
+        scoring = _submit_pass(_score, query, list(missing.values()), list(missing))
+        if scoring is None:
+            outcome = "skipped"
+            logging.debug("Rerank thread busy, keeping retrieval order")
+        else:
+            waiting = asyncio.wrap_future(scoring, loop=loop)
+            # A pass that outlives the budget may still fail; retrieve its error.
+            waiting.add_done_callback(lambda future: future.cancelled() or future.exception())
+            try:
+                scores = await asyncio.wait_for(asyncio.shield(waiting), max(remaining, 0))
+                cached_scores.update(zip(missing, scores))
+            except asyncio.TimeoutError:
+                outcome = "fallbacks"
+                # Drops the pass if it has not started; one already running
+                # finishes and fills the cache.
+                scoring.cancel()
+                logging.warning(
+                    f"Rerank of {len(missing)} chunks exceeded {budget_ms:.0f}ms, "
+                    "keeping retrieval order",
+                )
+            except Exception as e:
+                outcome = "errors"
+                logging.error(f"Error: rerank failed: {e}")
+
+    rerank_metrics.record(time.perf_counter() - started_at, outcome)
+    if outcome != "reranked":
+        return hits[:top_k]
+
+    ranked = sorted(
+        zip(keys, hits),
+        key=lambda item: cached_scores[item[0]],
+        reverse=True,
+    )
+    return [
+        {**hit, "rerank_score": cached_scores[key]}
+        for key, hit in ranked[:top_k]
+    ]
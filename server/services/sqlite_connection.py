@@ -0,0 +1,35 @@
+import os
+import sqlite3
+from typing import Optional
+
+
+class ProcessConnection:
+    """
+    Connection of this process to a SQLite database shared by every process
+    on the box, opened in WAL mode and created from `schema` on first use.
+
+    Callers serialize their use of the connection with their own lock.
+    """
+
+    def __init__(self, path: str, schema: str):
+        self.path = path
+        self.schema = schema
+        self._connection: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+
+    def get(self) -> sqlite3.Connection:
+        # Connections must not be shared with forked children.
+        if self._connection is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            connection = sqlite3.connect(
+                self.path,
+                timeout=30,
+                check_same_thread=False,
+                isolation_level=None,
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(self.schema)
+            self._connection = connection
+            self._pid = os.getpid()
+        return self._connection
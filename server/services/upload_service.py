@@ -0,0 +1,59 @@
+import asyncio
+import hashlib
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+from fastapi import UploadFile
+
+from server.settings import settings
+
+
+class UploadTooLargeError(Exception):
+    def __init__(self, max_bytes: int):
+        super().__init__(f"Upload exceeds the limit of {max_bytes} bytes")
+        self.max_bytes = max_bytes
+
+
+@dataclass
+class SavedUpload:
+    path: str
+    size: int
+    content_hash: str
+
+
+async def save_upload_file(
+    upload: UploadFile,
+    path: str,
+    max_bytes: Optional[int] = None,
+) -> SavedUpload:
+    """
+    Stream an upload to `path` in fixed-size chunks.
+
+    The sha256 and byte count are computed on the way, and the write is
+    aborted (and the partial file removed) as soon as `max_bytes` is passed.
+    """
+    if max_bytes is not None and upload.size is not None and upload.size > max_bytes:
+        raise UploadTooLargeError(max_bytes)
+
+    loop = asyncio.get_event_loop()
+    content_hash = hashlib.sha256()
+    size = 0
+
+    await upload.seek(0)
+    f = await loop.run_in_executor(None, open, path, "wb")
+    try:
+        while chunk := await upload.read(settings.upload_chunk_size):
+            size += len(chunk)
+            if max_bytes is not None and size > max_bytes:
+                raise UploadTooLargeError(max_bytes)
+            content_hash.update(chunk)
+            await loop.run_in_executor(None, f.write, chunk)
+    except BaseException:
+        await loop.run_in_executor(None, f.close)
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+
+    await loop.run_in_executor(None, f.close)
+    return SavedUpload(path=path, size=size, content_hash=content_hash.hexdigest())
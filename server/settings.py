@@ -1,6 +1,7 @@
 import enum
 from pathlib import Path
 from tempfile import gettempdir
+from typing import List
 
 import dotenv
 import os
@@ -41,12 +42,164 @@ class Settings(BaseSettings):
     # google_application_credentials: str
     openai_api_key: str
     mongodb_url: str = "mongodb://localhost:27017/"
+    # One Motor client per process, shared by requests, sockets and tasks
+    mongodb_max_pool_size: int = 100
+    mongodb_min_pool_size: int = 0
+    mongodb_max_idle_time_ms: int = 60000
+    mongodb_connect_timeout_ms: int = 5000
+    mongodb_server_selection_timeout_ms: int = 10000
+    # 0 disables the socket timeout
+    mongodb_socket_timeout_ms: int = 30000
+    # e.g. "zlib"; "zstd" and "snappy" need the zstandard / python-snappy packages
+    mongodb_compressors: str = ""
     milvus_db_username: str = "root"
     milvus_db_password: str = ""
     milvus_db_host: str = "localhost"
     milvus_db_port: int = 19530
     milvus_db_name: str = "default"
     milvus_db_collection: str = "codechat_collection"
+    # The collection handle is cached; reconnects back off between these delays
+    milvus_connect_timeout: float = 10
+    milvus_reconnect_min_delay: float = 1
+    milvus_reconnect_max_delay: float = 60
+    milvus_health_check_interval: float = 30
+    # Pending inserts and deletes are flushed together at this interval
+    milvus_flush_interval: float = 60
+
+    # Vector index: "HNSW", "IVF_FLAT" or "IVF_SQ8" with its build params
+    milvus_index_type: str = "IVF_FLAT"
+    milvus_index_params: dict = {"nlist": 128}
+    # Search params override, e.g. {"nprobe": 32} or {"ef": 128}. Otherwise
+    # the profile written by `python -m server.tests.tune_milvus_index` is
+    # used when it was tuned for the collection's index type and params, at
+    # a k of at least the search limit. HNSW's ef never goes below the limit.
+    milvus_search_params: dict = {}
+    milvus_search_profile_path: str = "server/stores/milvus_search_profile.json"
+
+    # Uploads are streamed to disk in chunks of this size
+    upload_chunk_size: int = 1024 * 1024
+    avatar_max_bytes: int = 5 * 1024 * 1024
+
+    # Ingestion job queue, consumed by `python -m server.worker`
+    ingestion_worker_concurrency: int = 1
+    ingestion_job_lease_seconds: int = 300
+    ingestion_job_max_attempts: int = 3
+    ingestion_job_retry_delay_seconds: int = 30
+    ingestion_job_poll_interval: float = 2.0
+    # How often the API checks for finished jobs to notify file owners
+    ingestion_job_notify_interval: float = 2.0
+
+    # Processes used to extract and OCR document pages in parallel
+    extraction_processes: int = os.cpu_count() or 1
+    extraction_pages_per_task: int = 8
+    # Pages with fewer text-layer characters than this are OCR'd
+    ocr_min_text_chars: int = 50
+    # Images smaller than this (in pixels, on either side) are not OCR'd
+    ocr_min_image_size: int = 64
+    ocr_max_dpi: int = 300
+    ocr_lang: str = "vie"
+    ocr_tesseract_config: str = ""
+    # On-disk cache of OCR results, keyed by image hash and OCR settings
+    ocr_cache_path: str = "server/stores/cache/ocr.sqlite3"
+    ocr_cache_max_bytes: int = 512 * 1024 * 1024
+
+    # Chunk sizes in tokens of `chunk_tokenizer`: "embedding" (the embedding
+    # model's tokenizer) or a tiktoken encoding such as "cl100k_base".
+    # Sentences are grouped up to chunk_min_tokens, longer paragraphs than
+    # chunk_max_tokens are split again; keep it under embedding_max_seq_length.
+    chunk_tokenizer: str = "embedding"
+    chunk_min_tokens: int = 160
+    chunk_max_tokens: int = 256
+    chunk_overlap_tokens: int = 16
+
+    # Bounded queues between the page -> chunk -> embed -> insert stages;
+    # chunks are embedded and inserted in groups of milvus_insert_batch_size
+    ingestion_queue_size: int = 64
+    milvus_insert_batch_size: int = 256
+
+    # Embedding backend: "torch" (fp32 SentenceTransformer) or "onnx" (int8
+    # model exported with `python -m server.tests.onnx_encoder export`)
+    embedding_backend: str = "torch"
+    embedding_onnx_dir: str = "server/stores/models/gte-multilingual-base-onnx"
+
+    # Ingestion embedding batches: sorted by token length and capped at
+    # embedding_batch_tokens padded tokens per forward pass
+    embedding_max_seq_length: int = 512
+    embedding_batch_tokens: int = 16384
+    embedding_max_batch_size: int = 64
+    # torch / onnxruntime intra-op threads, 0 keeps the library default
+    embedding_num_threads: int = 0
+
+    # Query embeddings from concurrent chats are encoded together
+    query_batch_max_size: int = 32
+    query_batch_max_wait_ms: float = 5.0
+    # In-process LRU of query vectors
+    query_cache_max_size: int = 10000
+    query_cache_ttl_seconds: float = 3600
+
+    # On-disk cache of chunk embeddings, keyed by model and chunk text
+    embedding_cache_enabled: bool = True
+    embedding_cache_path: str = "server/stores/cache/embeddings.sqlite3"
+    embedding_cache_max_bytes: int = 2 * 1024 * 1024 * 1024
+
+    # One embedding server process, started by `python -m server`, serves
+    # every uvicorn worker over a Unix socket instead of each loading the model
+    embedding_server_enabled: bool = True
+    embedding_server_socket: str = "/tmp/codechat-embedding.sock"
+    embedding_server_start_timeout: float = 300
+    embedding_client_pool_size: int = 8
+    # After a failed request, encode locally for this long before retrying
+    embedding_client_retry_seconds: float = 30
+
+    # BM25 index of chunks (SQLite FTS5), fused with vector hits for bots
+    # with hybrid_search on; hybrid_search_default applies to bots without it
+    lexical_index_enabled: bool = True
+    lexical_index_path: str = "server/stores/index/lexical.sqlite3"
+    hybrid_search_default: bool = False
+    # Hits taken from each retriever before fusion, and the RRF constant
+    hybrid_candidates: int = 20
+    hybrid_rrf_k: int = 60
+
+    # Cross-encoder rerank of rerank_candidates retrieved chunks down to top_k,
+    # scored on CPU in batches of rerank_batch_size
+    rerank_enabled: bool = False
+    rerank_model: str = "BAAI/bge-reranker-v2-m3"
+    rerank_candidates: int = 20
+    rerank_batch_size: int = 32
+    rerank_max_length: int = 512
+    # Past this budget the retrieval order is kept; the scores still finish
+    # in the background and are cached
+    rerank_budget_ms: float = 300
+    # Passes queued or running at once; further questions skip the rerank
+    rerank_max_pending_passes: int = 1
+    # On-disk cache of (query, chunk) scores
+    rerank_cache_path: str = "server/stores/cache/rerank.sqlite3"
+    rerank_cache_max_bytes: int = 256 * 1024 * 1024
+
+    # Answers per bot and version of its files, reused for questions whose
+    # embedding has at least answer_cache_threshold cosine similarity
+    answer_cache_enabled: bool = True
+    answer_cache_threshold: float = 0.95
+    # Most recent answers compared per question, held in memory per bot for
+    # answer_cache_index_ttl_seconds before being reloaded from Mongo
+    answer_cache_max_entries_per_bot: int = 200
+    answer_cache_max_bots: int = 256
+    answer_cache_index_ttl_seconds: float = 60
+    answer_cache_ttl_seconds: float = 7 * 24 * 3600
+
+    # Answer chains are built at startup for these models; a bot's
+    # response_model outside the list is answered by llm_default_model
+    llm_default_model: str = "gpt-4"
+    llm_models: List[str] = ["gpt-4", "gpt-4o", "gpt-4o-mini", "gpt-3.5-turbo"]
+    # Keep-alive HTTP pool shared by every model
+    llm_max_connections: int = 100
+    llm_max_keepalive_connections: int = 20
+    llm_keepalive_expiry: float = 30
+    llm_timeout: float = 60
+    # Answer every bot with the local stub model, e.g. for offline load tests;
+    # only then can bots also set response_model to "stub"
+    llm_stub_enabled: bool = False
+    llm_stub_token_delay: float = 0.01
 
     # Current environment
     environment: str = "dev"
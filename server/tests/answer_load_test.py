@@ -0,0 +1,88 @@
+"""
+Load-test the streamed answer path offline with the stub model.
+
+    python -m server.tests.answer_load_test --concurrency 50 --requests 500
+
+Runs the prebuilt answer chain of `--model` (the local stub by default, so
+no OpenAI calls are made) with `--concurrency` answers streaming at once.
+Reports time to first token, total answer time and throughput, and how
+late a 10ms timer on the same event loop fires, which stays small while
+nothing blocks the loop.
+"""
+import argparse
+import asyncio
+import time
+
+import numpy as np
+from langchain.schema import Document
+
+from server.services.llm_registry import STUB_MODEL, build_answer_chains, get_answer_chain
+from server.services.openai_service import AnswerStreamFilter
+from server.settings import settings
+
+CONTEXT = [
+    Document(
+        "Hợp đồng có hiệu lực từ ngày ký và thời hạn thanh toán là 30 ngày.",
+        metadata={"file_name": "hop-dong.pdf"},
+    ),
+]
+
+
+async def answer(chain, question):
+    started_at = time.perf_counter()
+    first_token_at = None
+    stream_filter = AnswerStreamFilter()
+    async for token in chain.astream({"context": CONTEXT, "question": question}):
+        if stream_filter.feed(token) and first_token_at is None:
+            first_token_at = time.perf_counter()
+    finished_at = time.perf_counter()
+    return (first_token_at or finished_at) - started_at, finished_at - started_at
+
+
+async def measure_loop_lag(stop, interval=0.01):
+    lags = []
+    while not stop.is_set():
+        started_at = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - started_at - interval)
+    return lags
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--model", default=STUB_MODEL)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+
+    if args.model == STUB_MODEL:
+        # The stub only answers while it is enabled.
+        settings.llm_stub_enabled = True
+    build_answer_chains()
+    chain = get_answer_chain(args.model)
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def limited(i):
+        async with semaphore:
+            return await answer(chain, f"Thời hạn thanh toán là bao lâu? ({i})")
+
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(measure_loop_lag(stop))
+    started_at = time.perf_counter()
+    results = await asyncio.gather(*(limited(i) for i in range(args.requests)))
+    elapsed = time.perf_counter() - started_at
+    stop.set()
+    lags = np.asarray(await lag_task) * 1000
+
+    first_token, total = (np.asarray(values) * 1000 for values in zip(*results))
+    print(f"{args.requests} answers, concurrency {args.concurrency}, {elapsed:.2f}s")
+    print(f"  throughput       {args.requests / elapsed:8.1f} answers/s")
+    for name, values in (("first token", first_token), ("answer", total), ("loop lag", lags)):
+        print(
+            f"  {name:<16} p50 {np.percentile(values, 50):8.1f}ms  "
+            f"p95 {np.percentile(values, 95):8.1f}ms  max {values.max():8.1f}ms",
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,42 @@
+"""
+Rebuild the BM25 lexical index from the chunks stored in Milvus.
+
+    python -m server.tests.build_lexical_index
+
+Needed once for files ingested before the index existed; new ingestions,
+reindexes and deletes keep it up to date.
+"""
+from collections import defaultdict
+
+from server.config.milvusdb import get_milvusdb
+from server.services.lexical_index import lexical_index
+
+
+def build(batch_size=1000):
+    milvusdb = get_milvusdb()
+    iterator = milvusdb.query_iterator(
+        batch_size=batch_size,
+        expr='file_id != ""',
+        output_fields=["file_id", "file_name", "text"],
+    )
+    rebuilt_file_ids = set()
+    chunk_count = 0
+    try:
+        while docs := iterator.next():
+            chunks_by_file = defaultdict(list)
+            for doc in docs:
+                chunks_by_file[(doc["file_id"], doc["file_name"])].append(doc["text"])
+
+            for (file_id, file_name), chunks in chunks_by_file.items():
+                if file_id not in rebuilt_file_ids:
+                    lexical_index.delete_file(file_id)
+                    rebuilt_file_ids.add(file_id)
+                lexical_index.add_chunks(file_id, file_name, chunks)
+                chunk_count += len(chunks)
+            print(f"Indexed {chunk_count} chunks of {len(rebuilt_file_ids)} files")
+    finally:
+        iterator.close()
+
+
+if __name__ == "__main__":
+    build()
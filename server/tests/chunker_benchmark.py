@@ -0,0 +1,149 @@
+"""
+Compare the token-aware ChunkAssembler with the previous chunker.
+
+    python -m server.tests.chunker_benchmark --pdf document.pdf
+    python -m server.tests.chunker_benchmark --pages 500 1000 2000
+
+Without a PDF a synthetic Vietnamese-like document of the given page counts
+is used. Reports the time of each chunker, the number of chunks and their
+size in embedding tokens, including how many exceed the model's
+`embedding_max_seq_length` and would be truncated when embedded.
+"""
+import argparse
+import contextlib
+import os
+import random
+import time
+
+import numpy as np
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from server.services.chunker import ChunkAssembler, get_token_counter
+from server.services.file_service import split_content_to_sentences
+from server.settings import settings
+
+WORDS = (
+    "hợp đồng điều khoản bên mua bên bán thanh toán giao hàng bảo hành "
+    "trách nhiệm quyền lợi nghĩa vụ thời hạn hiệu lực tranh chấp giải quyết "
+    "the contract shall be governed by applicable law and regulations"
+).split()
+
+
+def legacy_text_from_pages(pages):
+    text = ""
+    for page in pages:
+        text += " " + page
+    return text
+
+
+def legacy_merge_sentences_into_chunks(sentences, min_length=500, max_length=800):
+    paragraphs = []
+    current_sentence = ""
+
+    for sentence in sentences:
+        if len(current_sentence) < min_length:
+            if current_sentence:
+                current_sentence += " " + sentence
+            else:
+                current_sentence = sentence
+        else:
+            paragraphs.append(current_sentence)
+            current_sentence = sentence
+
+    if current_sentence:
+        if len(current_sentence) < min_length and paragraphs:
+            paragraphs[-1] += " " + current_sentence
+        else:
+            paragraphs.append(current_sentence)
+
+    chunks = []
+    for paragraph in paragraphs:
+        paragraph_length = len(paragraph)
+        print(f"Paragraph lenght:  {paragraph_length}")
+
+        if paragraph_length > max_length:
+            ext_splitter = RecursiveCharacterTextSplitter(
+                chunk_size=min_length,
+                chunk_overlap=50,
+            )
+            chunks.extend(ext_splitter.split_text(paragraph))
+        else:
+            chunks.append(paragraph)
+
+    return chunks
+
+
+def synthetic_pages(page_count, seed=0):
+    rng = random.Random(seed)
+    pages = []
+    for _ in range(page_count):
+        sentences = []
+        for _ in range(rng.randint(15, 40)):
+            # Mostly normal sentences, with the odd run-on table row.
+            length = rng.randint(5, 30) if rng.random() > 0.02 else rng.randint(300, 600)
+            sentences.append(" ".join(rng.choice(WORDS) for _ in range(length)) + ".")
+        pages.append(" ".join(sentences))
+    return pages
+
+
+def pdf_pages(pdf_path):
+    import pymupdf
+
+    with pymupdf.open(pdf_path) as doc:
+        return [page.get_text() for page in doc]
+
+
+def run_legacy(pages):
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        text = legacy_text_from_pages(pages)
+        return legacy_merge_sentences_into_chunks(split_content_to_sentences(text))
+
+
+def run_assembler(pages):
+    assembler = ChunkAssembler()
+    chunks = []
+    for page in pages:
+        sentences = [sentence for sentence in split_content_to_sentences(page) if sentence]
+        chunks.extend(assembler.feed(sentences))
+    return chunks + assembler.flush()
+
+
+def describe(name, chunks, elapsed, count_tokens):
+    lengths = np.asarray(count_tokens(chunks)) if chunks else np.zeros(1)
+    truncated = int(np.sum(lengths > settings.embedding_max_seq_length))
+    print(
+        f"  {name:<10} {elapsed:8.3f}s  {len(chunks):6d} chunks  "
+        f"tokens p50 {np.percentile(lengths, 50):5.0f} "
+        f"p95 {np.percentile(lengths, 95):5.0f} max {lengths.max():5.0f}  "
+        f"truncated {truncated}",
+    )
+
+
+def benchmark(page_sets):
+    count_tokens = get_token_counter()
+    # Load the tokenizer and splitter before timing.
+    run_assembler(synthetic_pages(1))
+
+    for label, pages in page_sets:
+        print(f"{label}: {len(pages)} pages")
+        for name, run in (("legacy", run_legacy), ("assembler", run_assembler)):
+            started_at = time.perf_counter()
+            chunks = run(pages)
+            describe(name, chunks, time.perf_counter() - started_at, count_tokens)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pdf", default=None)
+    parser.add_argument("--pages", type=int, nargs="+", default=[100, 500, 2000])
+    args = parser.parse_args()
+
+    if args.pdf:
+        page_sets = [(args.pdf, pdf_pages(args.pdf))]
+    else:
+        page_sets = [("synthetic", synthetic_pages(count)) for count in args.pages]
+    benchmark(page_sets)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Measure recall@k and latency of vector-only against hybrid retrieval.
+
+    python -m server.tests.hybrid_recall questions.jsonl --k 5
+
+Each line of the input is a labelled question:
+
+    {"query": "Mã số thuế của công ty?", "file_ids": ["..."], "expected": "0312345678"}
+
+A question counts as recalled when one of the top-k chunks contains the
+`expected` text.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import numpy as np
+
+from server.services.file_service import get_similar_docs_by_file_ids
+
+
+async def evaluate(questions, k, hybrid):
+    recalled, latencies = [], []
+    for question in questions:
+        started_at = time.perf_counter()
+        docs = await get_similar_docs_by_file_ids(
+            query=question["query"],
+            file_ids=question["file_ids"],
+            top_k=k,
+            hybrid=hybrid,
+        ) or []
+        latencies.append((time.perf_counter() - started_at) * 1000)
+        expected = question["expected"].lower()
+        recalled.append(any(expected in doc.page_content.lower() for doc in docs))
+    return np.mean(recalled), np.percentile(latencies, 50), np.percentile(latencies, 95)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("questions")
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    with open(args.questions, encoding="utf-8") as f:
+        questions = [json.loads(line) for line in f if line.strip()]
+
+    print(f"Questions: {len(questions)}")
+    for name, hybrid in (("vector", False), ("hybrid", True)):
+        recall, p50, p95 = await evaluate(questions, args.k, hybrid)
+        print(f"{name:<7} recall@{args.k} {recall:.3f}  p50 {p50:.1f}ms  p95 {p95:.1f}ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,171 @@
+"""
+Export the embedding model to int8 ONNX and check it against fp32.
+
+    python -m server.tests.onnx_encoder export
+    python -m server.tests.onnx_encoder evaluate --texts chunks.txt
+
+`evaluate` reads one text per line, or samples chunks from Milvus when no
+file is given, and reports cosine agreement with the fp32 vectors, recall@k
+of the nearest neighbours and the throughput of both backends.
+"""
+import argparse
+import os
+import shutil
+import time
+
+import numpy as np
+
+from server.config.milvusdb import get_milvusdb
+from server.services.encoders import (
+    EMBEDDING_MODEL_NAME,
+    ONNX_MODEL_FILE,
+    OnnxEncoder,
+    SentenceTransformerEncoder,
+)
+from server.settings import settings
+
+
+def export(output_dir=settings.embedding_onnx_dir, opset=17):
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.models import Pooling
+
+    class LastHiddenState(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask):
+            return self.model(
+                input_ids=input_ids,
+                attention_mask=attention_mask,
+            ).last_hidden_state
+
+    os.makedirs(output_dir, exist_ok=True)
+    model = SentenceTransformer(EMBEDDING_MODEL_NAME, trust_remote_code=True)
+    transformer = LastHiddenState(model[0].auto_model).eval()
+    features = model.tokenizer(["Xin chào, em là trợ lý AI"], return_tensors="pt")
+
+    fp32_path = os.path.join(output_dir, "model.onnx")
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer,
+            (features["input_ids"], features["attention_mask"]),
+            fp32_path,
+            input_names=["input_ids", "attention_mask"],
+            output_names=["last_hidden_state"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "last_hidden_state": {0: "batch", 1: "sequence"},
+            },
+            opset_version=opset,
+        )
+
+    quantize_dynamic(
+        fp32_path,
+        os.path.join(output_dir, ONNX_MODEL_FILE),
+        weight_type=QuantType.QInt8,
+    )
+    model.tokenizer.save_pretrained(output_dir)
+
+    pooling_dir = os.path.join(output_dir, "1_Pooling")
+    shutil.rmtree(pooling_dir, ignore_errors=True)
+    for module in model:
+        if isinstance(module, Pooling):
+            module.save(pooling_dir)
+
+    print(f"Exported {EMBEDDING_MODEL_NAME} to {output_dir}")
+
+
+def load_texts(texts_path=None, sample_size=2000):
+    if texts_path:
+        with open(texts_path, encoding="utf-8") as f:
+            return [line.strip() for line in f if line.strip()][:sample_size]
+
+    milvusdb = get_milvusdb()
+    docs = milvusdb.query(
+        expr='file_id != ""',
+        output_fields=["text"],
+        limit=sample_size,
+    )
+    return [doc["text"] for doc in docs]
+
+
+def _timed_encode(encoder, texts, batch_size):
+    started_at = time.perf_counter()
+    vectors = encoder.encode(texts, batch_size=batch_size)
+    elapsed = time.perf_counter() - started_at
+    vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors, len(texts) / elapsed
+
+
+def _top_k(vectors, queries, k):
+    scores = queries @ vectors.T
+    # A query is also in the corpus, never count it as its own neighbour.
+    np.fill_diagonal(scores[:, : len(queries)], -np.inf)
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def evaluate(texts_path=None, sample_size=2000, query_count=200, k=10, batch_size=32):
+    texts = load_texts(texts_path, sample_size)
+    query_count = min(query_count, len(texts))
+
+    baseline_vectors, baseline_speed = _timed_encode(
+        SentenceTransformerEncoder(),
+        texts,
+        batch_size,
+    )
+    candidate_vectors, candidate_speed = _timed_encode(
+        OnnxEncoder(),
+        texts,
+        batch_size,
+    )
+
+    agreement = np.sum(baseline_vectors * candidate_vectors, axis=1)
+
+    baseline_top_k = _top_k(baseline_vectors, baseline_vectors[:query_count], k)
+    candidate_top_k = _top_k(candidate_vectors, candidate_vectors[:query_count], k)
+    recall = np.mean(
+        [
+            len(set(expected) & set(found)) / k
+            for expected, found in zip(baseline_top_k, candidate_top_k)
+        ],
+    )
+
+    print(f"Texts: {len(texts)}, queries: {query_count}")
+    print(
+        f"Cosine agreement: mean {agreement.mean():.4f}, "
+        f"p1 {np.percentile(agreement, 1):.4f}, min {agreement.min():.4f}",
+    )
+    print(f"Recall@{k} against fp32: {recall:.4f}")
+    print(
+        f"Throughput: fp32 {baseline_speed:.1f} texts/s, "
+        f"onnx int8 {candidate_speed:.1f} texts/s "
+        f"(x{candidate_speed / baseline_speed:.2f})",
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export")
+    export_parser.add_argument("--output-dir", default=settings.embedding_onnx_dir)
+
+    evaluate_parser = subparsers.add_parser("evaluate")
+    evaluate_parser.add_argument("--texts", default=None)
+    evaluate_parser.add_argument("--sample-size", type=int, default=2000)
+    evaluate_parser.add_argument("--queries", type=int, default=200)
+    evaluate_parser.add_argument("--k", type=int, default=10)
+
+    args = parser.parse_args()
+    if args.command == "export":
+        export(args.output_dir)
+    else:
+        evaluate(args.texts, args.sample_size, args.queries, args.k)
+
+
+if __name__ == "__main__":
+    main()
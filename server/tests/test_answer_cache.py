@@ -0,0 +1,52 @@
+import pytest
+
+from server.services.answer_cache import knowledge_version
+from server.settings import settings
+
+FILES = [
+    {"_id": "file-1", "version": 1, "status": "SUCCESS"},
+    {"_id": "file-2", "version": 3, "status": "SUCCESS"},
+]
+
+
+def test_knowledge_version_ignores_file_order() -> None:
+    """The same files listed in another order give the same version."""
+    assert knowledge_version(FILES, "gpt-4") == knowledge_version(FILES[::-1], "gpt-4")
+
+
+@pytest.mark.parametrize(
+    "files",
+    [
+        FILES[:1],
+        [*FILES, {"_id": "file-3", "version": 1, "status": "SUCCESS"}],
+        [FILES[0], {**FILES[1], "version": 4}],
+        [FILES[0], {**FILES[1], "status": "PROCESSING"}],
+    ],
+)
+def test_knowledge_version_changes_with_files(files: list) -> None:
+    """
+    Adding, removing, replacing or reindexing a file gives a new version.
+
+    :param files: the bot's files after the change.
+    """
+    assert knowledge_version(files, "gpt-4") != knowledge_version(FILES, "gpt-4")
+
+
+def test_knowledge_version_changes_with_retrieval(monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    The model, hybrid search and the rerank model are part of the version.
+
+    :param monkeypatch: patches the rerank settings.
+    """
+    monkeypatch.setattr(settings, "rerank_enabled", False)
+    version = knowledge_version(FILES, "gpt-4")
+
+    assert knowledge_version(FILES, "gpt-4o") != version
+    assert knowledge_version(FILES, "gpt-4", hybrid=True) != version
+
+    monkeypatch.setattr(settings, "rerank_enabled", True)
+    reranked_version = knowledge_version(FILES, "gpt-4")
+    assert reranked_version != version
+
+    monkeypatch.setattr(settings, "rerank_model", "another-reranker")
+    assert knowledge_version(FILES, "gpt-4") != reranked_version
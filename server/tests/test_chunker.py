@@ -0,0 +1,121 @@
+from typing import List
+
+import pytest
+
+from server.services.chunker import ChunkAssembler
+
+
+def count_words(texts: List[str]) -> List[int]:
+    return [len(text.split()) for text in texts]
+
+
+class WordSplitter:
+    """Splits a text into pieces of `size` words."""
+
+    def __init__(self, size: int):
+        self.size = size
+
+    def split_text(self, text: str) -> List[str]:
+        words = text.split()
+        return [
+            " ".join(words[start : start + self.size])
+            for start in range(0, len(words), self.size)
+        ]
+
+
+def merge_all_at_once(
+    sentences: List[str],
+    min_length: int,
+    max_length: int,
+    splitter: WordSplitter,
+) -> List[str]:
+    """The chunking done on a whole document before it was made incremental."""
+    paragraphs = []
+    current, length = [], 0
+    for sentence, sentence_length in zip(sentences, count_words(sentences)):
+        if current and length >= min_length:
+            paragraphs.append((current, length))
+            current, length = [], 0
+        current.append(sentence)
+        length += sentence_length
+
+    if current:
+        if length < min_length and paragraphs:
+            parts, paragraph_length = paragraphs[-1]
+            paragraphs[-1] = (parts + current, paragraph_length + length)
+        else:
+            paragraphs.append((current, length))
+
+    chunks = []
+    for parts, paragraph_length in paragraphs:
+        text = " ".join(parts)
+        if paragraph_length > max_length:
+            chunks.extend(splitter.split_text(text))
+        else:
+            chunks.append(text)
+    return chunks
+
+
+def make_sentences(count: int) -> List[str]:
+    # Sentences of 1 to 7 words, some longer than a whole chunk.
+    return [
+        " ".join(f"w{index}_{word}" for word in range(index % 7 + 1 + (index % 11 == 0) * 20))
+        for index in range(count)
+    ]
+
+
+@pytest.mark.parametrize("sentence_count", [0, 1, 2, 5, 40, 200])
+@pytest.mark.parametrize("page_size", [1, 3, 1000])
+def test_assembler_matches_whole_document_chunking(
+    sentence_count: int,
+    page_size: int,
+) -> None:
+    """
+    Feeding sentences page by page gives the chunks of the whole document.
+
+    :param sentence_count: sentences in the document.
+    :param page_size: sentences fed at a time.
+    """
+    sentences = make_sentences(sentence_count)
+    splitter = WordSplitter(size=6)
+    assembler = ChunkAssembler(
+        min_length=10,
+        max_length=16,
+        count_tokens=count_words,
+        splitter=splitter,
+    )
+
+    chunks = []
+    for start in range(0, len(sentences), page_size):
+        chunks.extend(assembler.feed(sentences[start : start + page_size]))
+    chunks.extend(assembler.flush())
+
+    assert chunks == merge_all_at_once(sentences, 10, 16, splitter)
+
+
+def test_short_trailing_paragraph_is_merged() -> None:
+    """A last paragraph under `min_length` is appended to the previous one."""
+    assembler = ChunkAssembler(
+        min_length=3,
+        max_length=100,
+        count_tokens=count_words,
+        splitter=WordSplitter(size=100),
+    )
+
+    chunks = assembler.feed(["a b c", "d e f", "g"]) + assembler.flush()
+
+    assert chunks == ["a b c", "d e f g"]
+
+
+def test_chunks_are_returned_once_final() -> None:
+    """Only the paragraph that can still be merged into is held back."""
+    assembler = ChunkAssembler(
+        min_length=2,
+        max_length=100,
+        count_tokens=count_words,
+        splitter=WordSplitter(size=100),
+    )
+
+    assert assembler.feed(["a b", "c d"]) == []
+    assert assembler.feed(["e f"]) == ["a b"]
+    assert assembler.flush() == ["c d", "e f"]
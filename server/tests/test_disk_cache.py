@@ -0,0 +1,68 @@
+import itertools
+from pathlib import Path
+
+import pytest
+
+from server.services import disk_cache
+from server.services.disk_cache import DiskCache
+
+
+@pytest.fixture
+def cache(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> DiskCache:
+    """
+    Cache of 100 bytes with a clock that ticks once per access.
+
+    :param tmp_path: directory of the cache file.
+    :param monkeypatch: patches the clock of the cache.
+    :return: the cache.
+    """
+    clock = itertools.count(1)
+    monkeypatch.setattr(disk_cache.time, "time", lambda: float(next(clock)))
+    return DiskCache(name="Test", path=str(tmp_path / "cache.sqlite3"), max_bytes=100)
+
+
+def test_get_many_returns_stored_values(cache: DiskCache) -> None:
+    """
+    Stored values are found, missing keys are counted as misses.
+
+    :param cache: the cache.
+    """
+    cache.set_many({"a": b"1", "b": b"22"})
+
+    assert cache.get_many(["a", "b", "c", "a"]) == {"a": b"1", "b": b"22"}
+    assert (cache.hits, cache.misses) == (2, 1)
+    assert cache.size() == 3
+
+
+def test_overwrite_keeps_total_size(cache: DiskCache) -> None:
+    """
+    Replacing a value counts only its new size.
+
+    :param cache: the cache.
+    """
+    cache.set("a", b"0123456789")
+    cache.set("a", b"01234")
+
+    assert cache.get("a") == b"01234"
+    assert cache.size() == 5
+
+
+def test_least_recently_used_entries_are_evicted(cache: DiskCache) -> None:
+    """
+    Past `max_bytes` the least recently read or written entries are dropped
+    until the cache is back under 90% of it.
+
+    :param cache: the cache.
+    """
+    keys = "abcdefghij"
+    for key in keys:
+        cache.set(key, b"x" * 10)
+    assert cache.size() == 100
+
+    # Read, so "b" and "c" become the oldest entries.
+    assert cache.get("a") is not None
+    cache.set("k", b"x" * 10)
+
+    remaining = cache.get_many([*keys, "k"])
+    assert sorted(remaining) == ["a", "d", "e", "f", "g", "h", "i", "j", "k"]
+    assert cache.size() == 90
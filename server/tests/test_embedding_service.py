@@ -0,0 +1,125 @@
+from typing import List
+
+import numpy as np
+import pytest
+
+from server.services import embedding_service
+from server.services.embedding_service import EmbeddingEngine, QueryVectorCache
+
+
+def make_engine(batch_tokens: int, max_batch_size: int) -> EmbeddingEngine:
+    # make_batches only needs the lengths, not an encoder.
+    return EmbeddingEngine(None, batch_tokens=batch_tokens, max_batch_size=max_batch_size)
+
+
+def padded_size(batch: List[int], lengths: List[int]) -> int:
+    return max(lengths[i] for i in batch) * len(batch)
+
+
+@pytest.mark.parametrize(
+    "lengths",
+    [[], [5], [3, 90, 12, 12, 40, 7, 7, 7, 64, 1], list(range(1, 200))],
+)
+def test_batches_cover_every_text_once(lengths: List[int]) -> None:
+    """
+    Every text is in exactly one batch, within the token and size caps.
+
+    :param lengths: token length of each text.
+    """
+    engine = make_engine(batch_tokens=128, max_batch_size=8)
+
+    batches = engine.make_batches(lengths)
+
+    assert sorted(i for batch in batches for i in batch) == list(range(len(lengths)))
+    for batch in batches:
+        assert len(batch) <= 8
+        assert len(batch) == 1 or padded_size(batch, lengths) <= 128
+
+
+def test_batches_group_similar_lengths() -> None:
+    """Texts are sorted by length, so short texts are not padded to long ones."""
+    lengths = [10, 100, 10, 100, 10, 100]
+    engine = make_engine(batch_tokens=300, max_batch_size=64)
+
+    batches = engine.make_batches(lengths)
+
+    assert [sorted(batch) for batch in batches] == [[1, 3, 5], [0, 2, 4]]
+
+
+def test_text_over_budget_gets_its_own_batch() -> None:
+    """A text longer than `batch_tokens` is still encoded, alone."""
+    engine = make_engine(batch_tokens=50, max_batch_size=64)
+
+    batches = engine.make_batches([80, 10, 10])
+
+    assert batches == [[0], [1, 2]]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> FakeClock:
+    """
+    Clock of the query vector cache.
+
+    :param monkeypatch: patches the clock.
+    :return: the clock, advanced by setting `now`.
+    """
+    fake_clock = FakeClock()
+    monkeypatch.setattr(embedding_service.time, "monotonic", fake_clock)
+    return fake_clock
+
+
+def test_query_cache_evicts_least_recently_used(clock: FakeClock) -> None:
+    """
+    Past `max_size` the least recently used vector is dropped.
+
+    :param clock: clock of the cache.
+    """
+    cache = QueryVectorCache(max_size=2, ttl_seconds=60)
+    cache.set("a", np.zeros(3))
+    cache.set("b", np.zeros(3))
+    assert cache.get("a") is not None
+
+    cache.set("c", np.zeros(3))
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+    assert cache.stats()["size"] == 2
+
+
+def test_query_cache_expires_entries(clock: FakeClock) -> None:
+    """
+    Vectors are only served for `ttl_seconds`.
+
+    :param clock: clock of the cache.
+    """
+    cache = QueryVectorCache(max_size=10, ttl_seconds=60)
+    cache.set("a", np.ones(3))
+
+    clock.now = 59
+    assert cache.get("a") is not None
+    clock.now = 61
+    assert cache.get("a") is None
+    assert cache.stats()["size"] == 0
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_query_cache_vectors_are_read_only(clock: FakeClock) -> None:
+    """
+    Cached vectors are shared, so callers cannot modify them.
+
+    :param clock: clock of the cache.
+    """
+    cache = QueryVectorCache()
+    cache.set("a", np.ones(3))
+
+    with pytest.raises(ValueError):
+        cache.get("a")[0] = 2
@@ -0,0 +1,82 @@
+import unicodedata
+from pathlib import Path
+
+from server.services.hybrid_search import fuse_hits, reciprocal_rank_fusion
+from server.services.lexical_index import LexicalIndex, tokenize
+
+
+def test_tokenize_adds_syllable_pairs() -> None:
+    """Adjacent syllables are also indexed as one compound term."""
+    assert tokenize("Hợp đồng lao động") == [
+        "hợp",
+        "đồng",
+        "hợp_đồng",
+        "lao",
+        "đồng_lao",
+        "động",
+        "lao_động",
+    ]
+
+
+def test_tokenize_keeps_diacritics_and_normalizes() -> None:
+    """Diacritics are kept, and decomposed input gives the same terms."""
+    assert tokenize("Mã ma") == ["mã", "ma", "mã_ma"]
+    assert tokenize(unicodedata.normalize("NFD", "Hợp đồng")) == tokenize("Hợp đồng")
+
+
+def test_tokenize_keeps_codes_whole_and_split() -> None:
+    """A code with separators is a term of its own as well as its parts."""
+    terms = tokenize("NĐ-CP v2.3")
+
+    assert "nđ_cp" in terms
+    assert "v2_3" in terms
+    assert {"nđ", "cp", "v2", "3"} <= set(terms)
+
+
+def test_lexical_search_is_restricted_to_files(tmp_path: Path) -> None:
+    """
+    Only chunks of the requested files are returned, best match first.
+
+    :param tmp_path: directory of the index file.
+    """
+    index = LexicalIndex(str(tmp_path / "lexical.sqlite3"))
+    index.add_chunks("file-1", "a.pdf", ["hợp đồng lao động", "thời tiết hôm nay"])
+    index.add_chunks("file-2", "b.pdf", ["hợp đồng lao động có thời hạn"])
+
+    hits = index.search("hợp đồng lao động", ["file-1"], limit=10)
+
+    assert [hit["text"] for hit in hits] == ["hợp đồng lao động"]
+    assert hits[0]["file_id"] == "file-1"
+
+    index.delete_file("file-1")
+    hits = index.search("hợp đồng", ["file-1", "file-2"], limit=10)
+    assert [hit["file_id"] for hit in hits] == ["file-2"]
+
+
+def test_reciprocal_rank_fusion_sums_ranks() -> None:
+    """A key ranked in both lists beats keys ranked first in only one."""
+    scores = reciprocal_rank_fusion([["a", "b"], ["c", "b"]], k=60)
+
+    assert list(scores) == ["b", "a", "c"]
+    assert scores["b"] == 1 / 62 + 1 / 62
+    assert scores["a"] == scores["c"] == 1 / 61
+
+
+def test_fuse_hits_prefers_vector_hit_fields() -> None:
+    """The same chunk found by both retrievers is returned once, with the
+    fields of its vector hit."""
+    vector_hits = [
+        {"text": "a", "distance": 0.9},
+        {"text": "b", "distance": 0.8},
+    ]
+    lexical_hits = [
+        {"text": "c", "score": 7.0},
+        {"text": "b", "score": 5.0},
+    ]
+
+    fused = fuse_hits(vector_hits, lexical_hits, key=lambda hit: hit["text"], limit=2)
+
+    assert [hit["text"] for hit in fused] == ["b", "a"]
+    assert fused[0]["distance"] == 0.8
+    assert "score" not in fused[0]
+    assert fused[0]["rrf_score"] > fused[1]["rrf_score"]
@@ -0,0 +1,303 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from typing import Dict, List
+
+import pytest
+from bson import ObjectId
+
+from server.services import job_queue
+from server.settings import settings
+from server.web.api.file.schema import FileSchema, FileStatus, JobStatus
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def matches(document: dict, query: dict) -> bool:
+    """The subset of Mongo queries used by the job queue."""
+    for field, condition in query.items():
+        if field == "$or":
+            if not any(matches(document, branch) for branch in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = document.get(field)
+            for operator, operand in condition.items():
+                if value is None:
+                    return False
+                if operator == "$lt" and not value < operand:
+                    return False
+                if operator == "$lte" and not value <= operand:
+                    return False
+                if operator == "$gte" and not value >= operand:
+                    return False
+        elif document.get(field) != condition:
+            return False
+    return True
+
+
+class FakeCollection:
+    """In-memory stand-in for the Motor collections used by the job queue."""
+
+    def __init__(self):
+        self.documents: List[dict] = []
+
+    def _apply(self, document: dict, update: dict):
+        document.update(update.get("$set", {}))
+        for field, amount in update.get("$inc", {}).items():
+            document[field] = document.get(field, 0) + amount
+
+    async def insert_one(self, document: dict):
+        document = {"_id": ObjectId(), **document}
+        self.documents.append(document)
+        return SimpleNamespace(inserted_id=document["_id"])
+
+    async def find_one_and_update(self, query, update, return_document, sort=()):
+        found = [document for document in self.documents if matches(document, query)]
+        for field, _ in reversed(sort):
+            found.sort(key=lambda document: document[field])
+        if not found:
+            return None
+        self._apply(found[0], update)
+        return dict(found[0])
+
+    async def update_one(self, query, update):
+        for document in self.documents:
+            if matches(document, query):
+                self._apply(document, update)
+                return SimpleNamespace(matched_count=1)
+        return SimpleNamespace(matched_count=0)
+
+    def get(self, document_id: str) -> dict:
+        return next(
+            document for document in self.documents if document["_id"] == ObjectId(document_id)
+        )
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.collections: Dict[str, FakeCollection] = {}
+
+    def get_collection(self, name: str) -> FakeCollection:
+        return self.collections.setdefault(name, FakeCollection())
+
+
+class Clock:
+    def __init__(self):
+        self.now = START
+
+    def advance(self, seconds: float):
+        self.now += timedelta(seconds=seconds)
+
+    def __call__(self) -> datetime:
+        return self.now
+
+
+@pytest.fixture
+def db(monkeypatch: pytest.MonkeyPatch) -> FakeDatabase:
+    """
+    In-memory database of the job queue.
+
+    :param monkeypatch: patches the database of the job queue.
+    :return: the database.
+    """
+    database = FakeDatabase()
+    monkeypatch.setattr(job_queue, "get_db", lambda: database)
+    return database
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> Clock:
+    """
+    Clock of the job queue.
+
+    :param monkeypatch: patches the clock of the job queue.
+    :return: the clock.
+    """
+    fake_clock = Clock()
+    monkeypatch.setattr(job_queue, "_now", fake_clock)
+    return fake_clock
+
+
+async def enqueue(db: FakeDatabase) -> str:
+    file_id = str(ObjectId())
+    await db.get_collection("files").insert_one(
+        {"_id": ObjectId(file_id), "status": FileStatus.loading},
+    )
+    job = await job_queue.enqueue_ingestion_job(
+        FileSchema(_id=file_id, name="a.pdf", owner=str(ObjectId()), status=FileStatus.loading),
+    )
+    # Due right away on the fake clock.
+    db.get_collection(job_queue.JOBS_COLLECTION).get(job.id)["available_at"] = START
+    return job.id
+
+
+def job_document(db: FakeDatabase, job_id: str) -> dict:
+    return db.get_collection(job_queue.JOBS_COLLECTION).get(job_id)
+
+
+@pytest.mark.anyio
+async def test_lease_takes_a_job_once(db: FakeDatabase, clock: Clock) -> None:
+    """
+    A queued job is leased by one worker; others find nothing to do.
+
+    :param db: database of the job queue.
+    :param clock: clock of the job queue.
+    """
+    job_id = await enqueue(db)
+
+    job = await job_queue.lease_job("worker-1")
+
+    assert job.id == job_id
+    assert job.status == JobStatus.running
+    assert job.worker_id == "worker-1"
+    assert job.attempts == 1
+    assert await job_queue.lease_job("worker-2") is None
+
+
+@pytest.mark.anyio
+async def test_expired_lease_is_taken_over(db: FakeDatabase, clock: Clock) -> None:
+    """
+    A job whose worker stopped renewing its lease goes to another worker,
+    and the first one can no longer renew or complete it.
+
+    :param db: database of the job queue.
+    :param clock: clock of the job queue.
+    """
+    await enqueue(db)
+    job = await job_queue.lease_job("worker-1")
+
+    clock.advance(settings.ingestion_job_lease_seconds / 2)
+    assert await job_queue.renew_lease(job, "worker-1")
+    clock.advance(settings.ingestion_job_lease_seconds - 1)
+    assert await job_queue.lease_job("worker-2") is None
+
+    clock.advance(2)
+    taken_over = await job_queue.lease_job("worker-2")
+    assert taken_over.id == job.id
+    assert taken_over.attempts == 2
+
+    assert not await job_queue.renew_lease(job, "worker-1")
+    assert not await job_queue.complete_job(job, "worker-1")
+    assert job_document(db, job.id)["status"] == JobStatus.running
+
+
+@pytest.mark.anyio
+async def test_stale_lease_cannot_fail_job(db: FakeDatabase, clock: Clock) -> None:
+    """
+    A slot of the same worker that lost the lease cannot fail the job or
+    its file for the slot that took it over.
+
+    :param db: database of the job queue.
+    :param clock: clock of the job queue.
+    """
+    job_id = await enqueue(db)
+    job = await job_queue.lease_job("worker-1")
+    # As if on its last attempt, so failing it would give up.
+    job.attempts = settings.ingestion_job_max_attempts
+
+    clock.advance(settings.ingestion_job_lease_seconds + 1)
+    taken_over = await job_queue.lease_job("worker-1")
+    assert taken_over.lease_id != job.lease_id
+
+    await job_queue.fail_job(job, "worker-1", "boom")
+
+    assert job_document(db, job_id)["status"] == JobStatus.running
+    assert db.get_collection("files").get(job.file_id)["status"] == FileStatus.loading
+    assert await job_queue.complete_job(taken_over, "worker-1")
+
+
+@pytest.mark.anyio
+async def test_failed_job_is_retried_then_given_up(db: FakeDatabase, clock: Clock) -> None:
+    """
+    A failed job is requeued after the retry delay until its attempts run
+    out, then it and its file are marked failed.
+
+    :param db: database of the job queue.
+    :param clock: clock of the job queue.
+    """
+    job_id = await enqueue(db)
+
+    for attempt in range(1, settings.ingestion_job_max_attempts + 1):
+        job = await job_queue.lease_job("worker-1")
+        assert job.attempts == attempt
+        await job_queue.fail_job(job, "worker-1", "boom")
+        assert await job_queue.lease_job("worker-1") is None
+        clock.advance(settings.ingestion_job_retry_delay_seconds)
+
+    document = job_document(db, job_id)
+    assert document["status"] == JobStatus.failed
+    assert document["error"] == "boom"
+    assert document["finished_at"] is not None
+    assert await job_queue.lease_job("worker-1") is None
+    assert db.get_collection("files").get(job.file_id)["status"] == FileStatus.error
+
+
+@pytest.mark.anyio
+async def test_release_keeps_attempts_and_indexing_mark(
+    db: FakeDatabase,
+    clock: Clock,
+) -> None:
+    """
+    A released job is queued again without using up an attempt, and still
+    tells the next attempt that chunks may have been written.
+
+    :param db: database of the job queue.
+    :param clock: clock of the job queue.
+    """
+    await enqueue(db)
+    job = await job_queue.lease_job("worker-1")
+    await job_queue.mark_indexing_started(job, "worker-1")
+
+    await job_queue.release_job(job, "worker-1")
+
+    released = await job_queue.lease_job("worker-2")
+    assert released.attempts == 1
+    assert released.indexing_started_at == START
+
+
+@pytest.mark.anyio
+async def test_complete_job(db: FakeDatabase, clock: Clock) -> None:
+    """
+    A completed job is done and no longer leased.
+
+    :param db: database of the job queue.
+    :param clock: clock of the job queue.
+    """
+    job_id = await enqueue(db)
+    job = await job_queue.lease_job("worker-1")
+
+    await job_queue.complete_job(job, "worker-1")
+
+    document = job_document(db, job_id)
+    assert document["status"] == JobStatus.done
+    assert document["lease_expires_at"] is None
+    assert document["finished_at"] == START
+    clock.advance(settings.ingestion_job_lease_seconds * 2)
+    assert await job_queue.lease_job("worker-2") is None
+
+
+@pytest.mark.anyio
+async def test_job_crashing_every_worker_is_given_up(
+    db: FakeDatabase,
+    clock: Clock,
+) -> None:
+    """
+    A job whose worker dies on every attempt is not leased again once its
+    attempts are used up; it and its file are marked failed.
+
+    :param db: database of the job queue.
+    :param clock: clock of the job queue.
+    """
+    job_id = await enqueue(db)
+
+    for attempt in range(1, settings.ingestion_job_max_attempts + 1):
+        assert await job_queue.fail_abandoned_job() is None
+        job = await job_queue.lease_job(f"worker-{attempt}")
+        assert job.attempts == attempt
+        clock.advance(settings.ingestion_job_lease_seconds + 1)
+
+    assert await job_queue.lease_job("worker-0") is None
+    abandoned = await job_queue.fail_abandoned_job()
+    assert abandoned.id == job_id
+    assert job_document(db, job_id)["status"] == JobStatus.failed
+    assert db.get_collection("files").get(abandoned.file_id)["status"] == FileStatus.error
+    assert await job_queue.fail_abandoned_job() is None
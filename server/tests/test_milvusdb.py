@@ -0,0 +1,64 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from server.config import milvusdb
+from server.config.milvusdb import index_config_key, milvus_manager, search_params
+from server.settings import settings
+
+
+@pytest.fixture
+def hnsw_profile(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    An HNSW collection with a profile tuned at k=5 to ef=16.
+
+    :param tmp_path: directory of the profile.
+    :param monkeypatch: patches the index and the settings.
+    """
+    build_params = {"M": 16, "efConstruction": 200}
+    profile_path = tmp_path / "profile.json"
+    profile_path.write_text(
+        json.dumps(
+            {
+                "k": 5,
+                "indexes": {
+                    index_config_key("HNSW", build_params): {"search_params": {"ef": 16}},
+                },
+            },
+        ),
+    )
+    monkeypatch.setattr(milvus_manager, "index_type", "HNSW")
+    monkeypatch.setattr(milvus_manager, "index_build_params", build_params)
+    monkeypatch.setattr(settings, "milvus_search_profile_path", str(profile_path))
+    monkeypatch.setattr(settings, "milvus_search_params", {})
+    milvusdb._load_search_profile.cache_clear()
+    yield
+    milvusdb._load_search_profile.cache_clear()
+
+
+def test_tuned_params_used_up_to_tuned_k(hnsw_profile: None) -> None:
+    """
+    The profile applies to searches of at most the k it was tuned at.
+
+    :param hnsw_profile: the tuned profile.
+    """
+    assert search_params(5)["params"] == {"ef": 16}
+    # Tuned for top 5 only: the default, which already covers 20 hits.
+    assert search_params(20)["params"] == {"ef": 64}
+
+
+def test_ef_is_at_least_the_limit(
+    hnsw_profile: None,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """
+    Milvus rejects an HNSW search whose ef is below its limit.
+
+    :param hnsw_profile: the tuned profile.
+    :param monkeypatch: patches the search params override.
+    """
+    monkeypatch.setattr(settings, "milvus_search_params", {"ef": 16})
+
+    assert search_params(20)["params"] == {"ef": 20}
+    assert search_params(100)["params"] == {"ef": 100}
@@ -0,0 +1,54 @@
+import re
+from typing import List
+
+import pytest
+
+from server.services.openai_service import SUGGEST_QUESTION_MARKER, AnswerStreamFilter
+
+RESPONSES = [
+    "<<Em xin trả lời câu hỏi của anh/chị: hợp đồng có thời hạn 12 tháng.>>",
+    "  Nội dung này em k có thông tin, mời anh/chị đặt câu hỏi khác "
+    "--suggest_question: <<Tài liệu này nói về nội dung gì?>>",
+    "Dấu < và > hay a->b vẫn được giữ nguyên.",
+    "",
+]
+
+
+def final_answer(response: str) -> str:
+    """The answer text of the final message, as built from the whole response."""
+    cleaned_text = re.sub(r"<<|>>", "", response)
+    return cleaned_text.split(SUGGEST_QUESTION_MARKER, 1)[0].strip()
+
+
+def split_every(text: str, size: int) -> List[str]:
+    return [text[start : start + size] for start in range(0, len(text), size)]
+
+
+def stream(tokens: List[str]) -> str:
+    stream_filter = AnswerStreamFilter()
+    return "".join(stream_filter.feed(token) for token in tokens) + stream_filter.flush()
+
+
+@pytest.mark.parametrize("response", RESPONSES)
+@pytest.mark.parametrize("token_size", [1, 2, 3, 5, 1000])
+def test_streamed_text_matches_final_answer(response: str, token_size: int) -> None:
+    """
+    Markers split across tokens are still removed, and nothing from the
+    suggested question on is streamed.
+
+    :param response: full model response.
+    :param token_size: characters per streamed token.
+    """
+    assert stream(split_every(response, token_size)) == final_answer(response)
+
+
+def test_marker_prefix_is_held_back() -> None:
+    """Text that may start a marker is only passed on once it is known."""
+    stream_filter = AnswerStreamFilter()
+
+    assert stream_filter.feed("câu trả lời <") == "câu trả lời"
+    assert stream_filter.feed("<tiếp") == " tiếp"
+    assert stream_filter.feed(" --sugg") == ""
+    assert stream_filter.feed("est_question: <<gợi ý>>") == ""
+    assert stream_filter.feed(" còn nữa") == ""
+    assert stream_filter.flush() == ""
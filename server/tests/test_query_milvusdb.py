@@ -1,6 +1,9 @@
 import json
+import sys
 
+from bson import ObjectId
 from dotenv import load_dotenv
+from pymongo import MongoClient
 from pymilvus import (
     Collection,
     CollectionSchema,
@@ -10,6 +13,9 @@ from pymilvus import (
     utility,
 )
 
+from server.config.milvusdb import index_params
+from server.settings import settings
+
 
 load_dotenv()
 
@@ -34,7 +40,14 @@ def list_collections():
         print(f"Error listing collections: {str(e)}")
 
 
-def create_collection(collection_name):
+def create_collection(collection_name, partition_key=True, num_partitions=64):
+    """
+    Create the chunk collection.
+
+    With `partition_key`, chunks are hashed into `num_partitions` partitions
+    by the owner of their file, and searches filtered by owner only scan
+    those partitions.
+    """
     try:
         connect_to_milvus()
 
@@ -49,19 +62,26 @@ def create_collection(collection_name):
             FieldSchema(name="file_id", dtype=DataType.VARCHAR, max_length=500),
             FieldSchema(name="file_name", dtype=DataType.VARCHAR, max_length=1000),
         ]
+        if partition_key:
+            fields.append(
+                FieldSchema(
+                    name="owner",
+                    dtype=DataType.VARCHAR,
+                    max_length=64,
+                    is_partition_key=True,
+                ),
+            )
 
         schema = CollectionSchema(fields=fields, description="File collection")
 
-        collection = Collection(name=collection_name, schema=schema)
+        collection = Collection(
+            name=collection_name,
+            schema=schema,
+            num_partitions=num_partitions if partition_key else None,
+        )
         print(f"Collection {collection_name} created successfully.")
 
-        index_params = {
-            "index_type": "IVF_FLAT",
-            "metric_type": "COSINE",
-            "params": {"nlist": 128},
-        }
-
-        collection.create_index(field_name="vector", index_params=index_params)
+        collection.create_index(field_name="vector", index_params=index_params())
         print(f"Index created for collection {collection_name}.")
 
     except Exception as e:
@@ -129,5 +149,92 @@ def drop_collection_data(collection_name):
         print(f"Lỗi khi xóa dữ liệu: {str(e)}")
 
 
+def _load_file_owners(file_ids):
+    """
+    Owner of each file id, "" for files that no longer exist or legacy ids
+    that are not ObjectIds, so they are not looked up again.
+    """
+    owners = dict.fromkeys(file_ids, "")
+    object_ids = [ObjectId(file_id) for file_id in file_ids if ObjectId.is_valid(file_id)]
+    if not object_ids:
+        return owners
+
+    mongo_client = MongoClient(settings.mongodb_url)
+    try:
+        files = mongo_client.CodeChat.get_collection("files").find(
+            {"_id": {"$in": object_ids}},
+            {"owner": 1},
+        )
+        owners.update(
+            {str(file["_id"]): str(file.get("owner") or "") for file in files},
+        )
+        return owners
+    finally:
+        mongo_client.close()
+
+
+def migrate_collection(source_name, target_name, batch_size=1000):
+    """
+    Copy every chunk of `source_name` into a new partition-key collection
+    `target_name`, filling `owner` from the files in MongoDB.
+
+    Point SERVER_MILVUS_DB_COLLECTION at the target once it is done; the
+    source is left untouched so the switch can be rolled back.
+    """
+    try:
+        connect_to_milvus()
+
+        create_collection(target_name, partition_key=True)
+        source = Collection(source_name)
+        target = Collection(target_name)
+        source.load()
+
+        iterator = source.query_iterator(
+            batch_size=batch_size,
+            expr="",
+            output_fields=["text", "vector", "file_id", "file_name"],
+        )
+        owners = {}
+        copied_count = 0
+        try:
+            while docs := iterator.next():
+                unknown_file_ids = {
+                    doc["file_id"]
+                    for doc in docs
+                    if doc["file_id"] and doc["file_id"] not in owners
+                }
+                if unknown_file_ids:
+                    owners.update(_load_file_owners(unknown_file_ids))
+
+                target.insert(
+                    [
+                        {
+                            "text": doc["text"],
+                            "vector": doc["vector"],
+                            "file_id": doc["file_id"],
+                            "file_name": doc["file_name"],
+                            "owner": owners.get(doc["file_id"], ""),
+                        }
+                        for doc in docs
+                    ],
+                )
+                copied_count += len(docs)
+                print(f"Copied {copied_count} chunks")
+        finally:
+            iterator.close()
+
+        target.flush()
+        target.load()
+        print(
+            f"Migrated {copied_count} chunks from {source_name} to {target_name}, "
+            f"{source.num_entities} in the source",
+        )
+    except Exception as e:
+        print(f"Error migrating {source_name} to {target_name}: {str(e)}")
+
+
 if __name__ == "__main__":
-    create_collection("codechat_collection")
+    if len(sys.argv) == 4 and sys.argv[1] == "migrate":
+        migrate_collection(sys.argv[2], sys.argv[3])
+    else:
+        create_collection("codechat_collection")
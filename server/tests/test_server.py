@@ -15,3 +15,20 @@ async def test_health(client: AsyncClient, fastapi_app: FastAPI) -> None:
     url = fastapi_app.url_path_for("health_check")
     response = await client.get(url)
     assert response.status_code == status.HTTP_200_OK
+    assert list(response.json()) == ["status"]
+
+
+@pytest.mark.anyio
+async def test_health_details_requires_auth(
+    client: AsyncClient,
+    fastapi_app: FastAPI,
+) -> None:
+    """
+    Checks that dependency details and metrics are not public.
+
+    :param client: client for the app.
+    :param fastapi_app: current FastAPI application.
+    """
+    url = fastapi_app.url_path_for("health_details")
+    response = await client.get(url)
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
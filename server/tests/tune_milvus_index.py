@@ -0,0 +1,223 @@
+"""
+Pick the cheapest Milvus index and search params that reach a recall target.
+
+    python -m server.tests.tune_milvus_index --recall 0.95
+
+Copies a sample of chunk vectors from the configured collection into a
+scratch collection, computes exact top-k neighbours with numpy, then builds
+each candidate index (HNSW, IVF_FLAT, IVF_SQ8), sweeps its search param
+upwards and measures recall@k and single-query latency. The cheapest
+setting that meets the target for each index is written to
+`settings.milvus_search_profile_path`; searches use the one tuned for the
+collection's index type and build params, when they ask for at most k hits.
+k defaults to the most hits a chat search asks for.
+"""
+import argparse
+import json
+import os
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+from pymilvus import Collection, CollectionSchema, DataType, FieldSchema, utility
+
+from server.config.milvusdb import (
+    METRIC_TYPE,
+    get_milvusdb,
+    index_config_key,
+    index_params,
+    max_search_limit,
+)
+from server.settings import settings
+
+SCRATCH_COLLECTION = f"{settings.milvus_db_collection}_tune"
+
+SEARCH_PARAM_NAMES = {"HNSW": "ef", "IVF_FLAT": "nprobe", "IVF_SQ8": "nprobe"}
+
+
+def candidate_indexes(corpus_size):
+    for m in (8, 16, 32):
+        yield "HNSW", {"M": m, "efConstruction": 200}
+    # Milvus recommends at least ~40 vectors per IVF cluster.
+    for nlist in (64, 128, 256, 1024, 4096):
+        if nlist * 40 <= corpus_size:
+            yield "IVF_FLAT", {"nlist": nlist}
+            yield "IVF_SQ8", {"nlist": nlist}
+
+
+def candidate_search_params(index_type, params, k):
+    if index_type == "HNSW":
+        return [ef for ef in (16, 32, 64, 128, 256, 512) if ef >= k]
+    return [nprobe for nprobe in (1, 2, 4, 8, 16, 32, 64, 128) if nprobe <= params["nlist"]]
+
+
+def load_vectors(sample_size, query_count, seed=0):
+    collection = get_milvusdb()
+    iterator = collection.query_iterator(
+        batch_size=1000,
+        expr='file_id != ""',
+        output_fields=["vector"],
+    )
+    vectors = []
+    try:
+        while (docs := iterator.next()) and len(vectors) < sample_size + query_count:
+            vectors.extend(doc["vector"] for doc in docs)
+    finally:
+        iterator.close()
+
+    vectors = np.asarray(vectors, dtype=np.float32)
+    np.random.default_rng(seed).shuffle(vectors)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    # Queries are held out of the corpus so none finds itself.
+    return vectors[query_count:], vectors[:query_count]
+
+
+def exact_top_k(corpus, queries, k):
+    scores = queries @ corpus.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def create_scratch_collection(corpus):
+    if utility.has_collection(SCRATCH_COLLECTION):
+        utility.drop_collection(SCRATCH_COLLECTION)
+
+    schema = CollectionSchema(
+        fields=[
+            FieldSchema(name="id", dtype=DataType.INT64, is_primary=True, auto_id=False),
+            FieldSchema(name="vector", dtype=DataType.FLOAT_VECTOR, dim=corpus.shape[1]),
+        ],
+        description="Index tuning scratch collection",
+    )
+    collection = Collection(name=SCRATCH_COLLECTION, schema=schema)
+    for start in range(0, len(corpus), 1000):
+        batch = corpus[start : start + 1000]
+        collection.insert([list(range(start, start + len(batch))), batch.tolist()])
+    collection.flush()
+    return collection
+
+
+def measure(collection, queries, expected, k, search_param, latency_queries=50):
+    results = collection.search(
+        data=queries.tolist(),
+        anns_field="vector",
+        param=search_param,
+        limit=k,
+    )
+    recall = np.mean(
+        [
+            len(set(hits.ids) & set(expected_ids.tolist())) / k
+            for hits, expected_ids in zip(results, expected)
+        ],
+    )
+
+    latencies = []
+    for query in queries[:latency_queries]:
+        started_at = time.perf_counter()
+        collection.search(
+            data=[query.tolist()],
+            anns_field="vector",
+            param=search_param,
+            limit=k,
+        )
+        latencies.append(time.perf_counter() - started_at)
+    return float(recall), float(np.median(latencies) * 1000)
+
+
+def tune(target_recall=0.95, k=None, sample_size=50000, query_count=500):
+    k = k or max_search_limit()
+    corpus, queries = load_vectors(sample_size, query_count)
+    print(f"Corpus: {len(corpus)} vectors, queries: {len(queries)}")
+    expected = exact_top_k(corpus, queries, k)
+
+    collection = create_scratch_collection(corpus)
+    results = []
+    try:
+        for index_type, build_params in candidate_indexes(len(corpus)):
+            collection.release()
+            if collection.has_index():
+                collection.drop_index()
+            collection.create_index(
+                field_name="vector",
+                index_params=index_params(index_type, build_params),
+            )
+            collection.load()
+
+            param_name = SEARCH_PARAM_NAMES[index_type]
+            for value in candidate_search_params(index_type, build_params, k):
+                search_param = {"metric_type": METRIC_TYPE, "params": {param_name: value}}
+                recall, latency_ms = measure(collection, queries, expected, k, search_param)
+                results.append(
+                    {
+                        "index_type": index_type,
+                        "index_params": build_params,
+                        "search_params": {param_name: value},
+                        "recall": recall,
+                        "latency_ms": latency_ms,
+                    },
+                )
+                print(
+                    f"{index_type} {build_params} {param_name}={value}: "
+                    f"recall@{k} {recall:.4f}, p50 {latency_ms:.2f}ms",
+                )
+                # Larger values only cost more once the target is met.
+                if recall >= target_recall:
+                    break
+    finally:
+        collection.release()
+        utility.drop_collection(SCRATCH_COLLECTION)
+
+    passing = [result for result in results if result["recall"] >= target_recall]
+    if not passing:
+        print(f"No setting reached recall@{k} {target_recall}")
+        return None
+
+    # The first passing setting of each index is its cheapest.
+    indexes = {}
+    for result in passing:
+        key = index_config_key(result["index_type"], result["index_params"])
+        indexes.setdefault(key, result)
+
+    best = min(passing, key=lambda result: result["latency_ms"])
+    profile = {
+        "indexes": indexes,
+        "best": best,
+        "k": k,
+        "target_recall": target_recall,
+        "corpus_size": len(corpus),
+        "tuned_at": datetime.now(timezone.utc).isoformat(),
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(settings.milvus_search_profile_path) or ".", exist_ok=True)
+    with open(settings.milvus_search_profile_path, "w") as f:
+        json.dump(profile, f, indent=2)
+
+    print(
+        f"Best: {best['index_type']} {best['index_params']} {best['search_params']} "
+        f"(recall@{k} {best['recall']:.4f}, p50 {best['latency_ms']:.2f}ms), "
+        f"profiles of {len(indexes)} indexes written to "
+        f"{settings.milvus_search_profile_path}",
+    )
+    if (
+        best["index_type"] != settings.milvus_index_type
+        or best["index_params"] != settings.milvus_index_params
+    ):
+        print(
+            f"Set SERVER_MILVUS_INDEX_TYPE={best['index_type']} and "
+            f"SERVER_MILVUS_INDEX_PARAMS='{json.dumps(best['index_params'])}', "
+            "then rebuild the collection index to use it",
+        )
+    return profile
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--recall", type=float, default=0.95)
+    parser.add_argument("--k", type=int, default=None)
+    parser.add_argument("--sample-size", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=500)
+    args = parser.parse_args()
+    tune(args.recall, args.k, args.sample_size, args.queries)
+
+
+if __name__ == "__main__":
+    main()
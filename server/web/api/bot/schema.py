@@ -42,6 +42,8 @@ class Bot(BaseModel):
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     avatar_source: Optional[str] = None
     response_model: str
+    # Fuse BM25 hits with vector hits; None follows settings.hybrid_search_default
+    hybrid_search: Optional[bool] = None
 
     class Config:
         json_encoders = {ObjectId: str}
@@ -61,6 +63,7 @@ class BotUpdate(BaseModel):
     list_user_permission: Optional[List[UserPermission]] = None
     list_files: Optional[List[str]] = None
     response_model: str
+    hybrid_search: Optional[bool] = None
 
 
 class BotResponse(BaseModel):
@@ -74,6 +77,7 @@ class BotResponse(BaseModel):
     created_at: datetime
     avatar_source: Optional[str] = None
     response_model: str
+    hybrid_search: Optional[bool] = None
 
     class Config:
         json_encoders = {ObjectId: str}
@@ -1,6 +1,6 @@
 import asyncio
 import os
-from typing import Annotated, List
+from typing import Annotated, List, Optional
 from uuid import uuid4
 
 from bson import ObjectId
@@ -21,7 +21,14 @@ from server.config.logging import logging
 from server.config.mongodb import get_db
 from server.constants.common import Pagination
 from server.services.auth import get_current_active_user
-from server.services.file_service import insert_file
+from server.services.file_service import (
+    exceeds_remaining_capacity,
+    get_remaining_file_capacity,
+    insert_file,
+)
+from server.services.llm_registry import is_allowed_response_model
+from server.services.upload_service import UploadTooLargeError, save_upload_file
+from server.settings import settings
 from server.types.common import ListDataResponse, User
 from server.web.api.chat_history.schema import ChatHistory
 from server.web.api.chat_history.service import delete_messages_by_list_id
@@ -41,6 +48,14 @@ from .schema import (
 router = APIRouter()
 
 
+def _check_response_model(response_model: Optional[str]):
+    if response_model is not None and not is_allowed_response_model(response_model):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Response model {response_model} is not available",
+        )
+
+
 @router.get("/", response_model=ListDataResponse[BotResponse])
 async def get_bots_by_user(
     current_user: Annotated[User , Depends(get_current_active_user)],
@@ -104,7 +119,9 @@ async def create_bot(
     description: str = Form(...),
     response_model: str = Form(...),
     avatar: UploadFile = File(None),
+    hybrid_search: Optional[bool] = Form(None),
 ):
+    _check_response_model(response_model)
 
     db = get_db()
     bots_collection = db.get_collection("bots")
@@ -128,8 +145,17 @@ async def create_bot(
         filename = f"{uuid4()}.jpg"
         avatar_path = os.path.join(save_dir, filename)
 
-        with open(avatar_path, "wb") as f:
-            f.write(await avatar.read())
+        try:
+            await save_upload_file(
+                avatar,
+                avatar_path,
+                max_bytes=settings.avatar_max_bytes,
+            )
+        except UploadTooLargeError:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail="Avatar is too large",
+            )
 
         avatar_source = avatar_path
 
@@ -139,6 +165,7 @@ async def create_bot(
         "description": description,
         "list_user_permission": user_permissions,
         "response_model": response_model,
+        "hybrid_search": hybrid_search,
         "owner": current_user.id,
         "avatar_source": avatar_source,
     }
@@ -247,6 +274,8 @@ async def update_bot(
     bot_id: str,
     bot_update: BotUpdate = Body(...),
 ):
+    _check_response_model(bot_update.response_model)
+
     bots_collection = get_db().get_collection("bots")
     existing_bot = await bots_collection.find_one(
         {"_id": ObjectId(bot_id), "owner": current_user.id},
@@ -291,15 +320,20 @@ async def update_bot(
     save_dir = os.path.join("server/stores/bot/")
     os.makedirs(save_dir, exist_ok=True)
 
-    old_avatar = existing_bot.get("avatar_source")
-    if old_avatar and os.path.exists(old_avatar):
-        os.remove(old_avatar)
-
     filename = f"{uuid4()}.jpg"
     file_path = os.path.join(save_dir, filename)
 
-    with open(file_path, "wb") as f:
-        f.write(await avatar.read())
+    try:
+        await save_upload_file(avatar, file_path, max_bytes=settings.avatar_max_bytes)
+    except UploadTooLargeError:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail="Avatar is too large",
+        )
+
+    old_avatar = existing_bot.get("avatar_source")
+    if old_avatar and os.path.exists(old_avatar):
+        os.remove(old_avatar)
 
     await bots_collection.update_one(
         {"_id": ObjectId(bot_id)},
@@ -775,11 +809,31 @@ async def upload_files_to_bot(
             detail="Bot not found or you does not have permission to edit files",
         )
 
-    inserted_file_ids = []
+    remaining_capacity = await get_remaining_file_capacity(current_user.id)
+    if exceeds_remaining_capacity(files, remaining_capacity):
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail="Files exceed the remaining capacity of your package",
+        )
 
+    inserted_file_ids = []
+    too_large = False
     for file in files:
-        inserted_file = await insert_file(file=file, user_id=current_user.id)
-        inserted_file_ids.append(inserted_file.id)
+        try:
+            inserted_file = await insert_file(
+                file=file,
+                user_id=current_user.id,
+                max_bytes=remaining_capacity,
+            )
+        except UploadTooLargeError:
+            # Only for files without a declared size; the files saved so far
+            # are still attached below rather than left out of the bot.
+            too_large = True
+            break
+        if inserted_file:
+            inserted_file_ids.append(inserted_file.id)
+            if remaining_capacity is not None:
+                remaining_capacity -= inserted_file.size
 
     # Thêm file vào bot
     update_result = await bots_collection.update_one(
@@ -787,6 +841,12 @@ async def upload_files_to_bot(
         {"$push": {"list_files": {"$each": inserted_file_ids}}},
     )
 
+    if too_large:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail="File exceeds the remaining capacity of your package",
+        )
+
     if update_result.modified_count == 0:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -1,5 +1,5 @@
 """API for checking project status."""
 
-from server.web.api.file.views import router
-
-__all__ = ["router"]
+# The router is not re-exported here; server.web.api.router imports it from
+# `views`. The services import this package's schema and the views import the
+# services, so loading the views with the package made a cycle.
@@ -29,6 +29,48 @@ class FileSchema(BaseModel):
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     disabled: bool = False
     status: FileStatus
+    # sha256 of the file content, used to reuse the vectors of identical files
+    content_hash: Optional[str] = None
+    # Bumped every time the content is replaced
+    version: int = 1
+
+    class Config:
+        json_encoders = {ObjectId: str, Enum: lambda e: e.value}
+
+
+class JobStatus(str, Enum):
+    queued = "QUEUED"
+    running = "RUNNING"
+    done = "DONE"
+    failed = "FAILED"
+
+
+class JobKind(str, Enum):
+    # Index a new file from scratch
+    ingest = "INGEST"
+    # Re-chunk replaced content, embedding only chunks that changed
+    reindex = "REINDEX"
+
+
+class IngestionJob(BaseModel):
+    id: Optional[PyObjectId] = Field(alias="_id", default=None)
+    file_id: str
+    kind: JobKind = JobKind.ingest
+    owner: Optional[str] = None
+    status: JobStatus = JobStatus.queued
+    attempts: int = 0
+    error: Optional[str] = None
+    worker_id: Optional[str] = None
+    # New on every lease; only the holder of the current lease may renew,
+    # complete, fail or release the job.
+    lease_id: Optional[str] = None
+    lease_expires_at: Optional[datetime] = None
+    # Set once an attempt starts writing the file's chunks; kept across
+    # releases and retries so the next attempt knows to clear them first.
+    indexing_started_at: Optional[datetime] = None
+    available_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    finished_at: Optional[datetime] = None
 
     class Config:
         json_encoders = {ObjectId: str, Enum: lambda e: e.value}
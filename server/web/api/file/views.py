@@ -20,10 +20,15 @@ from server.config.mongodb import get_db
 from server.constants.common import Pagination
 from server.services.auth import get_current_active_user
 from server.services.file_service import (
+    FileBusyError,
     delete_file_by_file_id,
+    exceeds_remaining_capacity,
     get_docs_by_file_id,
+    get_remaining_file_capacity,
     insert_file,
+    replace_file_content,
 )
+from server.services.upload_service import UploadTooLargeError
 from server.types.common import ListDataResponse, User
 
 from .schema import Doc
@@ -200,14 +205,69 @@ async def upload_files(
 ):
     
     inserted_files = []
+    remaining_capacity = await get_remaining_file_capacity(current_user.id)
+    if exceeds_remaining_capacity(files, remaining_capacity):
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail="Files exceed the remaining capacity of your package",
+        )
 
     for file in files:
-        inserted_file = await insert_file(file=file, user_id=current_user.id)
+        try:
+            inserted_file = await insert_file(
+                file=file,
+                user_id=current_user.id,
+                max_bytes=remaining_capacity,
+            )
+        except UploadTooLargeError:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail="File exceeds the remaining capacity of your package",
+            )
         inserted_files.append(inserted_file)
+        if remaining_capacity is not None and inserted_file:
+            remaining_capacity -= inserted_file.size
 
     return inserted_files
 
 
+@router.put("/{file_id}/content", response_model=FileSchema)
+async def replace_file(
+    current_user: Annotated[User, Depends(get_current_active_user)],
+    file_id: str,
+    file: UploadFile = File(...),
+):
+    """
+    Replace the content of a file, keeping its id and bot links. Only chunks
+    that changed are embedded again.
+    """
+    try:
+        remaining_capacity = await get_remaining_file_capacity(current_user.id)
+        replaced_file = await replace_file_content(
+            file_id=file_id,
+            file=file,
+            user_id=current_user.id,
+            max_bytes=remaining_capacity,
+        )
+    except UploadTooLargeError:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail="File exceeds the remaining capacity of your package",
+        )
+    except FileBusyError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    except Exception as e:
+        logging.error(e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Could not replace file",
+        )
+
+    if replaced_file is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    return replaced_file
+
+
 @router.post("/restore/{file_id}", response_model=dict)
 async def delete_files(
     current_user: Annotated[User, Depends(get_current_active_user)],
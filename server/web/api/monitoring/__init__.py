@@ -0,0 +1,5 @@
+"""API for checking project status."""
+
+from server.web.api.monitoring.views import router
+
+__all__ = ["router"]
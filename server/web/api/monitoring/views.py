@@ -0,0 +1,38 @@
+from typing import Annotated
+
+from fastapi import APIRouter, Depends
+
+from server.config.milvusdb import milvus_manager
+from server.services.answer_cache import answer_cache_metrics
+from server.services.auth import get_current_active_admin
+from server.services.hybrid_search import retrieval_metrics
+from server.services.reranker import rerank_metrics
+from server.types.common import User
+
+router = APIRouter()
+
+
+@router.get("/health")
+def health_check() -> dict:
+    """
+    Checks the health of a project.
+
+    Always answers 200 while the app is up. Only the overall status is
+    public; see `health_details` for the dependencies and metrics.
+    """
+    return {"status": "ok" if milvus_manager.health()["healthy"] else "degraded"}
+
+
+@router.get("/health/details")
+def health_details(
+    current_admin: Annotated[User, Depends(get_current_active_admin)],
+) -> dict:
+    """Status of the dependencies and retrieval metrics, for admins."""
+    milvus = milvus_manager.health()
+    return {
+        "status": "ok" if milvus["healthy"] else "degraded",
+        "milvus": milvus,
+        "retrieval": retrieval_metrics.stats(),
+        "rerank": rerank_metrics.stats(),
+        "answer_cache": answer_cache_metrics.stats(),
+    }
@@ -0,0 +1,39 @@
+from datetime import datetime
+from typing import Optional, Tuple
+
+from bson import ObjectId
+
+from server.config.mongodb import get_db
+
+
+async def get_user_subscription(user_id: str) -> Tuple[Optional[dict], Optional[dict]]:
+    """
+    The user's latest unexpired order and its package, or no order and the
+    free package when there is no such order or its package is gone.
+    """
+    db = get_db()
+    order_collection = db.get_collection("orders")
+    package_collection = db.get_collection("packages")
+
+    latest_order = await order_collection.find_one(
+        {
+            "user_id": user_id,
+            "expiration_date": {"$gte": datetime.now()},
+        },
+        sort=[("order_date", -1)],
+    )
+
+    if latest_order:
+        existing_package = await package_collection.find_one(
+            {"_id": ObjectId(latest_order["package_id"])},
+        )
+        if existing_package:
+            return latest_order, existing_package
+
+    return None, await package_collection.find_one({"type": "PACKAGE_FREE"})
+
+
+async def get_user_package(user_id: str):
+    """Package of the user's latest unexpired order, or the free package."""
+    _, existing_package = await get_user_subscription(user_id)
+    return existing_package
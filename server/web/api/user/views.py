@@ -29,7 +29,10 @@ from server.services.auth import (
     get_password_hash,
     get_user,
 )
+from server.services.upload_service import UploadTooLargeError, save_upload_file
+from server.settings import settings
 from server.types.common import ListDataResponse, Token, User
+from server.web.api.package.service import get_user_subscription
 
 from .schema import UserPackageInfo, UserRegister, UserResponse, UserUpdate
 
@@ -174,19 +177,24 @@ async def upload_avatar(
     save_dir = os.path.join("server/stores/user/")
     os.makedirs(save_dir, exist_ok=True)
 
-    # Xóa avatar cũ nếu tồn tại
-    if current_user.avatar_source:
-        old_avatar_path = current_user.avatar_source
-        if os.path.exists(old_avatar_path):
-            os.remove(old_avatar_path)
-
     # Tạo tên file ngẫu nhiên dựa trên UUID
     filename = f"{uuid4()}.jpg"
     file_path = os.path.join(save_dir, filename)
 
     # Lưu file ảnh mới
-    with open(file_path, "wb") as f:
-        f.write(await avatar.read())
+    try:
+        await save_upload_file(avatar, file_path, max_bytes=settings.avatar_max_bytes)
+    except UploadTooLargeError:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail="Avatar is too large",
+        )
+
+    # Xóa avatar cũ nếu tồn tại
+    if current_user.avatar_source:
+        old_avatar_path = current_user.avatar_source
+        if os.path.exists(old_avatar_path):
+            os.remove(old_avatar_path)
 
     current_user.avatar_source = file_path
 
@@ -228,45 +236,16 @@ async def get_avatar(user_id: str):
 async def get_package_info(
     current_user: Annotated[User, Depends(get_current_active_user)],
 ):
-    db = get_db()
-    order_collection = db.get_collection("orders")
-    package_collection = db.get_collection("packages")
-
-    today = datetime.now()
-
-    latest_order = await order_collection.find_one(
-        {
-            "user_id": current_user.id,
-            "expiration_date": {"$gte": today},
-        },
-        sort=[("order_date", -1)],
-    )
-
-    if not latest_order:
-        free_package = await package_collection.find_one({"type": "PACKAGE_FREE"})
-        if not free_package:
-            raise HTTPException(status_code=404, detail="Free package not found")
-
-        return UserPackageInfo(
-            pack=free_package,
-            registration_date=None,
-            expiration_date=None,
-            price=free_package.get("price", 0),  # Nếu package có giá trị price
-        )
-
-    existing_package = await package_collection.find_one(
-        {"_id": ObjectId(latest_order["package_id"])},
-    )
+    latest_order, existing_package = await get_user_subscription(current_user.id)
     if not existing_package:
-        free_package = await package_collection.find_one({"type": "PACKAGE_FREE"})
-        if not free_package:
-            raise HTTPException(status_code=404, detail="Free package not found")
+        raise HTTPException(status_code=404, detail="Free package not found")
 
+    if not latest_order:
         return UserPackageInfo(
-            pack=free_package,
+            pack=existing_package,
             registration_date=None,
             expiration_date=None,
-            price=free_package.get("price", 0),  # Nếu package có giá trị price
+            price=existing_package.get("price", 0),  # Nếu package có giá trị price
         )
 
     pack_info = UserPackageInfo(
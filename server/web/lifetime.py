@@ -1,7 +1,17 @@
+import asyncio
 from typing import Awaitable, Callable
 
 from fastapi import FastAPI
 
+from server.config.logging import logging
+from server.config.milvusdb import flush_milvus_writes, milvus_manager, watch_milvus
+from server.config.mongodb import close_mongodb, connect_mongodb
+from server.services.answer_cache import ensure_answer_cache_indexes
+from server.services.file_service import ensure_file_indexes
+from server.services.job_queue import watch_finished_jobs
+from server.services.llm_registry import build_answer_chains, close_llm_clients
+from server.services.reranker import warm_up_reranker
+
 
 def register_startup_event(
     app: FastAPI,
@@ -20,7 +30,14 @@ def register_startup_event(
     async def _startup() -> None:  # noqa: WPS430
         app.middleware_stack = None
         app.middleware_stack = app.build_middleware_stack()
-        pass  # noqa: WPS420
+        connect_mongodb()
+        await ensure_file_indexes()
+        await ensure_answer_cache_indexes()
+        warm_up_reranker()
+        build_answer_chains()
+        app.state.milvus_watcher = asyncio.create_task(watch_milvus())
+        app.state.milvus_flusher = asyncio.create_task(flush_milvus_writes())
+        app.state.job_watcher = asyncio.create_task(watch_finished_jobs())
 
     return _startup
 
@@ -37,6 +54,14 @@ def register_shutdown_event(
 
     @app.on_event("shutdown")
     async def _shutdown() -> None:  # noqa: WPS430
-        pass  # noqa: WPS420
+        app.state.job_watcher.cancel()
+        app.state.milvus_watcher.cancel()
+        app.state.milvus_flusher.cancel()
+        try:
+            milvus_manager.flush()
+        except Exception as e:
+            logging.error(f"Error: {e}")
+        await close_llm_clients()
+        close_mongodb()
 
     return _shutdown
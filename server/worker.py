@@ -0,0 +1,15 @@
+import asyncio
+
+
+def main() -> None:
+    """Entrypoint of the ingestion worker."""
+    # Imported here, not at module level: the extraction pool spawns its
+    # children, which re-import this module as `__mp_main__`, and they must
+    # not pull in the service stack and the embedding model with it.
+    from server.services.ingestion_worker import run_worker
+
+    asyncio.run(run_worker())
+
+
+if __name__ == "__main__":
+    main()